@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+# This line inserts the package directory at the start of the system path
+# Assuming your example scripts are being run from the `example` directory
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import load_scene_template, expand_scene_template, write_scene_variants
+
+
+def main():
+    # The template describes how the corridor walls move and resize with the corridor width
+    template = load_scene_template(os.path.join("./", "l_shape_corridor_template.json"))
+
+    widths = np.round(np.arange(0.5, 1.51, 0.01), 2)
+    scenes = expand_scene_template(template, {"width": widths})
+
+    output_dir = os.path.join("./", "generated_corridors")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Write both the JSON and the URDF of every variant
+    output_file_paths = []
+    for width in widths:
+        file_name = f"l_shape_corridor_width_{width}"
+        output_file_paths.append(os.path.join(output_dir, file_name + ".json"))
+        output_file_paths.append(os.path.join(output_dir, file_name + ".urdf"))
+
+    saved_paths = write_scene_variants([scene for scene in scenes for _ in range(2)], output_file_paths)
+
+    print("Generated corridor scenes:", len(saved_paths))
+    print("----------------------------------------------------")
+
+
+# write_scene_variants starts worker processes, which import this script again
+# under the spawn and forkserver start methods
+if __name__ == "__main__":
+    main()
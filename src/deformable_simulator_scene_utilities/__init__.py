@@ -1,2 +1,12 @@
 from .json_to_urdf import (json_to_urdf, json_str_to_urdf)
-from .urdf_to_json import (urdf_to_json, urdf_str_to_json)
\ No newline at end of file
+from .urdf_to_json import (urdf_to_json, urdf_str_to_json)
+from .geometry_paths import (resolve_geometry_paths, resolve_geometry_path,
+                             build_package_index, clear_geometry_path_cache)
+from .scene import Scene
+from .scene_templates import (load_scene_template, expand_scene_template,
+                              write_scene_variants, generate_scene_variants)
+from .output_formats import OUTPUT_PROFILES
+from .scene_composition import compose_scenes, write_composed_scene
+from .scene_watch import SceneWatcher, watch_scenes
+from .mass_properties import (compute_mass_properties, add_mass_properties,
+                              clear_mesh_cache)
@@ -0,0 +1,188 @@
+import os
+
+from xml.etree import ElementTree
+
+import yourdfpy
+
+"""
+geometry_paths.py: Cached, batched resolution of geometry file names.
+
+Author: Burak Aksoy
+
+This module replaces the per-visual calls to `yourdfpy.filename_handler_magic`
+with a resolution layer that is cheap to call many times for the same files.
+`filename_handler_magic` probes the filesystem with several candidate paths for
+every call, which adds up quickly on network filesystems when a scene uses the
+same primitive mesh (e.g. `{primitives_dir}/box.obj`) hundreds of times.
+
+Features:
+- Per-conversion cache (a plain dict passed in by the caller) and a
+  process-wide cache of resolved paths.
+- Batched existence checks: the candidate paths of all requested file names
+  are collected first and each containing directory is listed only once.
+- `package://` lookup through a prebuilt package index (package name -> package
+  directory), built by scanning for `package.xml` files, e.g. in `ROS_PACKAGE_PATH`.
+- Configurable prefix rewriting rules for relocating hard-coded absolute paths
+  (such as the `/home/...` paths found in the example JSON files) before resolution.
+
+Resolution order for a single file name matches `filename_handler_magic`, with
+the package index consulted first for `package://` URIs. If no candidate exists,
+the (rewritten) input file name is returned unchanged.
+"""
+
+# Process-wide cache: (file name, context key) -> resolved file name
+_resolved_path_cache = {}
+
+
+def clear_geometry_path_cache():
+    """Clear the process-wide cache of resolved geometry paths."""
+    _resolved_path_cache.clear()
+
+
+def _read_package_name(package_xml_path):
+    try:
+        name = ElementTree.parse(package_xml_path).getroot().findtext("name")
+    except (OSError, ElementTree.ParseError):
+        return None
+    return name.strip() if name else None
+
+
+def build_package_index(search_paths=None):
+    """
+    Build a package name -> package directory index by scanning for `package.xml` files.
+
+    :type    search_paths: list of str
+    :param   search_paths: Directories to scan. Defaults to the entries of `ROS_PACKAGE_PATH`.
+    :rtype:  dict
+    :return: Mapping from package name to its absolute directory.
+             The first occurrence of a package name wins, as in ROS.
+    """
+    if search_paths is None:
+        search_paths = [p for p in os.environ.get("ROS_PACKAGE_PATH", "").split(os.pathsep) if p]
+
+    package_index = {}
+    for search_path in search_paths:
+        for dir_path, dir_names, file_names in os.walk(search_path):
+            if "package.xml" in file_names:
+                package_name = _read_package_name(os.path.join(dir_path, "package.xml"))
+                if package_name is None:
+                    package_name = os.path.basename(os.path.normpath(dir_path))
+                package_index.setdefault(package_name, os.path.abspath(dir_path))
+                # Packages are not nested in ROS workspaces
+                dir_names[:] = []
+            else:
+                # Skip hidden directories such as .git
+                dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+    return package_index
+
+
+def _apply_rewrite_rules(fname, rewrite_rules):
+    # The first matching (old_prefix, new_prefix) rule wins
+    for old_prefix, new_prefix in rewrite_rules:
+        if fname.startswith(old_prefix):
+            return new_prefix + fname[len(old_prefix):]
+    return fname
+
+
+def _candidate_paths(fname, dir, package_index):
+    candidates = []
+
+    if package_index and fname.startswith("package://"):
+        package_name, _, relative_path = fname[len("package://"):].partition("/")
+        if package_name in package_index:
+            candidates.append(os.path.join(package_index[package_name], relative_path))
+
+    # Same candidates, in the same order, as yourdfpy.filename_handler_magic
+    candidates.append(yourdfpy.filename_handler_relative(fname, dir=dir))
+    candidates.append(yourdfpy.filename_handler_ignore_directive(fname))
+    for level in range(len(os.path.normpath(dir).split(os.path.sep))):
+        candidates.append(yourdfpy.filename_handler_relative_to_urdf_file_recursive(fname,
+                                                                                    urdf_fname=dir,
+                                                                                    level=level))
+    return candidates
+
+
+def _existing_files(paths):
+    # List every containing directory once instead of stat'ing every candidate. The listings
+    # only give the names, file types can cost a stat per entry (file systems without d_type),
+    # so only the candidates found in a listing are checked to be files
+    dir_listings = {}
+    existing = set()
+    for path in paths:
+        dir_path, base_name = os.path.split(os.path.abspath(path))
+        if dir_path not in dir_listings:
+            try:
+                dir_listings[dir_path] = set(os.listdir(dir_path))
+            except OSError:
+                dir_listings[dir_path] = set()
+        if base_name in dir_listings[dir_path] and os.path.isfile(path):
+            existing.add(path)
+    return existing
+
+
+def resolve_geometry_paths(fnames, dir="/",
+                           package_index=None, rewrite_rules=None,
+                           cache=None, use_process_cache=True):
+    """
+    Resolve many geometry file names at once.
+
+    :type    fnames: iterable of str
+    :param   fnames: File names or URIs (`file://`, `package://`) to resolve.
+    :type    dir: str
+    :param   dir: Directory that relative file names are resolved against.
+    :type    package_index: dict
+    :param   package_index: Package name -> directory, see `build_package_index`.
+    :type    rewrite_rules: list of (str, str)
+    :param   rewrite_rules: (old_prefix, new_prefix) pairs applied before resolution.
+    :type    cache: dict
+    :param   cache: Optional per-conversion cache, updated in place.
+    :type    use_process_cache: bool
+    :param   use_process_cache: Also read from and write to the process-wide cache.
+    :rtype:  dict
+    :return: Mapping from each input file name to its resolved file name.
+    """
+    rewrite_rules = tuple(tuple(rule) for rule in (rewrite_rules or ()))
+    package_index = package_index or {}
+    context_key = (dir, rewrite_rules, tuple(sorted(package_index.items())))
+    if cache is None:
+        cache = {}
+
+    resolved = {}
+    pending = {}  # file name -> (rewritten file name, candidate paths)
+    for fname in fnames:
+        if fname in resolved or fname in pending:
+            continue
+        key = (fname, context_key)
+        if key in cache:
+            resolved[fname] = cache[key]
+        elif use_process_cache and key in _resolved_path_cache:
+            resolved[fname] = cache[key] = _resolved_path_cache[key]
+        else:
+            rewritten = _apply_rewrite_rules(fname, rewrite_rules)
+            pending[fname] = (rewritten, _candidate_paths(rewritten, dir, package_index))
+
+    if pending:
+        existing = _existing_files({c for _, candidates in pending.values() for c in candidates})
+
+        for fname, (rewritten, candidates) in pending.items():
+            resolved_fname = next((c for c in candidates if c in existing), None)
+            key = (fname, context_key)
+            if resolved_fname is None:
+                # Not cached process-wide, the file may appear later
+                print("Unable to resolve geometry file: ", fname)
+                resolved_fname = rewritten
+            elif use_process_cache:
+                _resolved_path_cache[key] = resolved_fname
+
+            resolved[fname] = cache[key] = resolved_fname
+
+    return resolved
+
+
+def resolve_geometry_path(fname, dir="/",
+                          package_index=None, rewrite_rules=None,
+                          cache=None, use_process_cache=True):
+    """Resolve a single geometry file name, see `resolve_geometry_paths`."""
+    return resolve_geometry_paths([fname], dir,
+                                  package_index, rewrite_rules,
+                                  cache, use_process_cache)[fname]
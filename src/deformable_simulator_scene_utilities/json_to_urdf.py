@@ -4,11 +4,16 @@ import json
 
 import numpy as np
 
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from xml.etree.ElementTree import Element, SubElement
 
 import yourdfpy
 
+from .geometry_paths import resolve_geometry_paths
+from .mass_properties import add_mass_properties
+from .transforms import axis_angle_to_rotation_matrices, pose_transform
+from .output_formats import (DEFAULT_SIGNIFICANT_DIGITS, format_vectors, round_json_floats, dumps_urdf,
+                             urdf_header, urdf_footer, dumps_urdf_element, format_metadata_value)
+
 """
 json_to_urdf.py: Converts JSON scene descriptions to URDF files for ROS environments.
 
@@ -25,17 +30,31 @@ Key Features:
 - Each entry in 'RigidBodies' is converted into a URDF link with a fixed joint
   to the root. Link names are derived from the geometry file names and include
   unique identifiers.
+- Bodies with an optional 'group' field are attached to the link of their group
+  instead of the root. Groups are defined in the optional 'RigidBodyGroups'
+  dictionary (group name -> optional 'parent' group, 'translation', 'rotationAxis'
+  and 'rotationAngle' relative to the parent group or the root), and each group
+  becomes an empty link with a single fixed joint. Body poses stay relative to the
+  root in the JSON, their joints are written relative to their group, so moving a
+  group in the URDF only touches the joint of the group.
 - Transforms (translation and rotation) are applied as specified in the JSON.
 - Additional metadata from JSON (like density, friction coefficients) are
   embedded as custom XML elements within each link for comprehensive simulation
-  detail.
+  detail. The id, geometry file and axis-angle rotation of each body are
+  embedded as well, so that urdf_to_json restores the JSON exactly.
+- Bodies with mass properties ("mass", "centerOfMass" and "inertia", see
+  mass_properties.py) get an <inertial> element. With mass_properties=True they
+  are computed in bulk from the density and the geometry of the dynamic bodies first.
 - Mesh file paths are prefixed with 'file://' to conform to URI standards required
   by ROS and Tesseract environments.
+- Hard-coded geometry file paths can be relocated with prefix rewriting rules
+  and resolved against a package index (see geometry_paths.py).
 
 Usage:
 To generate a URDF from a JSON scene description, ensure that the JSON file is
 formatted correctly with all necessary fields. The output URDF is readable,
 with appropriate indentations and line breaks, enhancing usability and maintainability.
+Compact and canonical output profiles are available as well (see output_formats.py).
 
 Example:
 Run the function json_to_urdf with the path to your JSON file to generate and
@@ -47,6 +66,9 @@ yourdfpy[full] is installed for full functionality.
 
 """
 
+# Body fields written as the <inertial> element of a link (see mass_properties.py)
+_INERTIAL_FIELDS = ('mass', 'centerOfMass', 'inertia')
+
 def _save_urdf(urdf_str, output_file_path):
     if not (output_file_path == "" or output_file_path is None):
         try:
@@ -73,9 +95,305 @@ def _visualize_urdf(urdf_str):
     # Show the URDF model
     urdf_model.show()
 
-def _json_str_to_urdf(json_data):
+def _axis_angle_to_rpy(angle, axis):
+    q = np.array([
+        np.cos(angle / 2),
+        np.sin(angle / 2) * axis[0],
+        np.sin(angle / 2) * axis[1],
+        np.sin(angle / 2) * axis[2]
+    ])
+    
+    roll = np.arctan2(2*(q[0]*q[1] + q[2]*q[3]), 1 - 2*(q[1]**2 + q[2]**2))
+    s2 = 2*(q[0]*q[2] - q[3]*q[1])
+    pitch = np.arcsin(np.clip(s2, -1.0, 1.0)) # Clipping to avoid NaN due to machine precision
+    yaw = np.arctan2(2*(q[0]*q[3] + q[1]*q[2]), 1 - 2*(q[2]**2 + q[3]**2))
+    return [roll, pitch, yaw]
+
+def _rotation_matrix_to_rpy(R):
+    # Fixed axis roll, pitch, yaw angles of a rotation matrix (R = Rz(yaw) Ry(pitch) Rx(roll))
+    roll = np.arctan2(R[2, 1], R[2, 2])
+    pitch = np.arcsin(np.clip(-R[2, 0], -1.0, 1.0))
+    yaw = np.arctan2(R[1, 0], R[0, 0])
+    return [float(roll), float(pitch), float(yaw)]
+
+def _ordered_groups(groups, bodies=(), known_groups=()):
+    """
+    Groups ordered parents first, as a list of (group name, group) pairs.
+
+    Groups referenced by the bodies without a definition are added with an identity pose
+    relative to the root. Groups in `known_groups` are parents that are already placed.
+    Raises ValueError for unknown parent groups and cycles.
+    """
+    groups = dict(groups)
+    for body in bodies:
+        group_name = body.get('group')
+        if group_name is not None and group_name not in groups and group_name not in known_groups:
+            groups[group_name] = {}
+
+    ordered = []
+    placed = set(known_groups)
+    for group_name in groups:
+        # Walk up to the first placed ancestor, then place the chain top down
+        chain = []
+        chain_names = set()
+        while group_name not in placed:
+            if group_name in chain_names:
+                raise ValueError(f"Cycle in the parents of group '{group_name}'")
+            chain.append(group_name)
+            chain_names.add(group_name)
+            parent = groups[group_name].get('parent')
+            if parent is None:
+                break
+            if parent not in groups and parent not in placed:
+                raise ValueError(f"Unknown parent group '{parent}' of group '{group_name}'")
+            group_name = parent
+        for group_name in reversed(chain):
+            ordered.append((group_name, groups[group_name]))
+            placed.add(group_name)
+    return ordered
+
+def _json_str_to_urdf(json_data, package_index=None, path_rewrite_rules=None,
+                      output_profile="pretty", significant_digits=None, mass_properties=False):
     data = json.loads(json_data)
+    return _json_data_to_urdf(data, package_index, path_rewrite_rules,
+                              output_profile, significant_digits, mass_properties)
+
+def _link_name(body, geometry_file=None):
+    # Link names are derived from the geometry file name and the unique body id
+    if geometry_file is None:
+        geometry_file = body['geometryFile']
+    file_name = geometry_file.split('/')[-1].split('.')[0]
+    return f"link_{file_name}_id_{body['id']}"
+
+def _body_origins(bodies, group_transforms):
+    # Joint origin (xyz, rpy) of each body, relative to the frame of its group or the root
+    translations = []
+    rpys = []
+    for body in bodies:
+        group_name = body.get('group')
+        if group_name is None:
+            translations.append(body['translation'])
+            rpys.append(_axis_angle_to_rpy(body['rotationAngle'], body['rotationAxis']))
+            continue
+
+        group_transform = group_transforms[group_name]
+        group_rotation_inverse = group_transform[:3, :3].T
+        translation = np.dot(group_rotation_inverse, np.subtract(body['translation'], group_transform[:3, 3]))
+        body_rotation = axis_angle_to_rotation_matrices(body['rotationAxis'], body['rotationAngle'])[0]
+        rotation = np.dot(group_rotation_inverse, body_rotation)
+        translations.append([float(value) for value in translation])
+        rpys.append(_rotation_matrix_to_rpy(rotation))
+    return translations, rpys
+
+def _format_body_vectors(bodies, output_profile="pretty", significant_digits=None, group_transforms=None):
+    # Format the numbers of all bodies at once,
+    # returns the scale, collision scale, xyz and rpy strings of each body
+    num_bodies = len(bodies)
+    translations, rpys = _body_origins(bodies, {} if group_transforms is None else group_transforms)
+    vector_strs = format_vectors([body['scale'] for body in bodies]
+                                 + [body['collisionObjectScale'] for body in bodies]
+                                 + translations
+                                 + rpys,
+                                 output_profile, significant_digits)
+    return (vector_strs[:num_bodies],
+            vector_strs[num_bodies:2*num_bodies],
+            vector_strs[2*num_bodies:3*num_bodies],
+            vector_strs[3*num_bodies:])
+
+def _format_inertial_vectors(bodies, output_profile="pretty", significant_digits=None):
+    # Format the mass properties of all bodies at once, returns the center of mass string
+    # and the mass and inertia component strings of each body, None for the bodies without them
+    inertial_bodies = []
+    for i, body in enumerate(bodies):
+        present = [field in body for field in _INERTIAL_FIELDS]
+        if all(present):
+            inertial_bodies.append(i)
+        elif any(present):
+            missing = [field for field, is_present in zip(_INERTIAL_FIELDS, present) if not is_present]
+            raise ValueError(f"Body {body.get('id')} has mass properties without {', '.join(missing)}, "
+                             f"the <inertial> element needs all of {', '.join(_INERTIAL_FIELDS)}")
+    vector_strs = format_vectors([bodies[i]['centerOfMass'] for i in inertial_bodies]
+                                 + [[bodies[i]['mass']] + list(bodies[i]['inertia']) for i in inertial_bodies],
+                                 output_profile, significant_digits)
+    inertial_strs = [None] * len(bodies)
+    for k, i in enumerate(inertial_bodies):
+        inertial_strs[i] = (vector_strs[k], vector_strs[len(inertial_bodies) + k].split(' '))
+    return inertial_strs
+
+def _resolve_body_geometry_files(bodies, package_index=None, path_rewrite_rules=None, cache=None):
+    # Relocate the geometry files if requested, in one batch for all bodies
+    if package_index or path_rewrite_rules:
+        return resolve_geometry_paths([body['geometryFile'] for body in bodies], "/",
+                                      package_index=package_index,
+                                      rewrite_rules=path_rewrite_rules,
+                                      cache={} if cache is None else cache)
+    return {}
+
+def _rigid_body_to_urdf_elements(body, geometry_file, parent_link_name,
+                                 scale_str, collision_scale_str, xyz_str, rpy_str,
+                                 inertial_strs=None, metadata=None):
+    link_name = _link_name(body, geometry_file)
+
+    # Create link element
+    link = Element('link', {'name': link_name})
+
+    # Inertial element, the inertia tensor is given about the center of mass
+    if inertial_strs is not None:
+        com_str, (mass_str, ixx, ixy, ixz, iyy, iyz, izz) = inertial_strs
+        inertial = SubElement(link, 'inertial')
+        SubElement(inertial, 'origin', {'xyz': com_str, 'rpy': '0 0 0'})
+        SubElement(inertial, 'mass', {'value': mass_str})
+        SubElement(inertial, 'inertia', {'ixx': ixx, 'ixy': ixy, 'ixz': ixz,
+                                         'iyy': iyy, 'iyz': iyz, 'izz': izz})
+
+    # Visual element
+    visual = SubElement(link, 'visual')
+    geometry_v = SubElement(visual, 'geometry')
     
+    if "primitives/box.obj" in geometry_file:
+        box_v = SubElement(geometry_v, 'box')
+        box_v.set('size', scale_str)
+        
+    else:
+        mesh_v = SubElement(geometry_v, 'mesh')
+        mesh_v.set('filename', f"file://{geometry_file}")
+        mesh_v.set('scale', scale_str)
+
+    # Collision element
+    collision = SubElement(link, 'collision')
+    geometry_c = SubElement(collision, 'geometry')
+    
+    if "primitives/box.obj" in geometry_file:
+        box_c = SubElement(geometry_c, 'box')
+        box_c.set('size', collision_scale_str)
+    
+    else:
+        mesh_c = SubElement(geometry_c, 'mesh')
+        mesh_c.set('filename', f"file://{geometry_file}")    
+        mesh_c.set('scale', collision_scale_str)
+
+    # Fixed joint connecting this link to its parent link
+    joint = Element('joint', {'name': f'joint_{link_name}', 'type': 'fixed'})
+    parent = SubElement(joint, 'parent', {'link': parent_link_name})
+    child = SubElement(joint, 'child', {'link': link_name})
+    origin = SubElement(joint, 'origin')
+    origin.set('xyz', xyz_str)
+    origin.set('rpy', rpy_str)
+
+    # Add other properties as metadata, including the ones that the URDF
+    # elements can not represent exactly (id, geometry file of primitives,
+    # axis-angle rotation) so that urdf_to_json can restore them. Strings that would be
+    # read back as numbers or literals are quoted (see format_metadata_value)
+    for key, value in (body if metadata is None else metadata).items():
+        if key not in ['translation', 'scale', 'collisionObjectScale', 'mass', 'centerOfMass', 'inertia']:
+            meta = SubElement(link, key)
+            meta.text = format_metadata_value(value)
+
+    return link, joint
+
+def _group_to_urdf_elements(group_name, group, parent_link_name, xyz_str, rpy_str, metadata=None):
+    # Empty link of the group and the fixed joint connecting it to its parent link
+    link = Element('link', {'name': group_name})
+    joint = Element('joint', {'name': f'joint_{group_name}', 'type': 'fixed'})
+    SubElement(joint, 'parent', {'link': parent_link_name})
+    SubElement(joint, 'child', {'link': group_name})
+    origin = SubElement(joint, 'origin')
+    origin.set('xyz', xyz_str)
+    origin.set('rpy', rpy_str)
+
+    # The axis-angle rotation and the other group fields are embedded like the body metadata
+    for key, value in (group if metadata is None else metadata).items():
+        if key not in ['translation', 'parent']:
+            meta = SubElement(link, key)
+            meta.text = format_metadata_value(value)
+
+    return link, joint
+
+def _metadata_values(items, output_profile="pretty", significant_digits=None):
+    # Metadata of the compact and canonical profiles is rounded like the attribute vectors,
+    # all floats of a chunk in one vectorized call. Canonical metadata is written in key order.
+    if output_profile == "pretty":
+        return items
+    if significant_digits is None:
+        significant_digits = DEFAULT_SIGNIFICANT_DIGITS
+    items = round_json_floats(items, significant_digits)
+    if output_profile == "canonical":
+        items = [dict(sorted(item.items())) for item in items]
+    return items
+
+
+def _iter_urdf_elements(name, scene_chunks, package_index=None, path_rewrite_rules=None,
+                        output_profile="pretty", significant_digits=None):
+    """
+    Generate the links and joints of chunks of a JSON scene, one list of elements per chunk.
+
+    Each chunk is a dictionary with the "RigidBodies" and optionally the "RigidBodyGroups" of a part
+    of the scene. Groups can be the parents of groups and bodies of the same or later chunks.
+    """
+    resolution_cache = {}
+    group_transforms = {}
+    body_link_names = set()
+
+    for scene_chunk in scene_chunks:
+        bodies = scene_chunk['RigidBodies']
+        groups = scene_chunk.get('RigidBodyGroups', {})
+        elements = []
+
+        # Group links, each connected to its parent group or the root by a single joint
+        for group_name in groups:
+            if group_name in group_transforms:
+                raise ValueError(f"Group '{group_name}' is defined more than once")
+        ordered_groups = _ordered_groups(groups, bodies, group_transforms)
+        for group_name, group in ordered_groups:
+            if group_name == name or group_name in body_link_names:
+                raise ValueError(f"Group name '{group_name}' collides with a link name")
+            parent_transform = group_transforms.get(group.get('parent'), np.eye(4))
+            group_transforms[group_name] = np.dot(parent_transform, pose_transform(group))
+
+        group_vector_strs = format_vectors([group.get('translation', [0.0, 0.0, 0.0]) for _, group in ordered_groups]
+                                           + [_axis_angle_to_rpy(group.get('rotationAngle', 0.0),
+                                                                 group.get('rotationAxis', [0.0, 0.0, 1.0]))
+                                              for _, group in ordered_groups],
+                                           output_profile, significant_digits)
+        num_groups = len(ordered_groups)
+        group_metadata = _metadata_values([group for _, group in ordered_groups], output_profile, significant_digits)
+        for i, (group_name, group) in enumerate(ordered_groups):
+            parent_link_name = group.get('parent')
+            if parent_link_name is None:
+                parent_link_name = name
+            elements.extend(_group_to_urdf_elements(group_name, group, parent_link_name,
+                                                    group_vector_strs[i], group_vector_strs[num_groups + i],
+                                                    group_metadata[i]))
+
+        # Body links, connected to the link of their group or the root
+        resolved_geometry_files = _resolve_body_geometry_files(bodies, package_index, path_rewrite_rules,
+                                                               resolution_cache)
+        scale_strs, collision_scale_strs, xyz_strs, rpy_strs = _format_body_vectors(bodies, output_profile,
+                                                                                    significant_digits,
+                                                                                    group_transforms)
+        inertial_strs = _format_inertial_vectors(bodies, output_profile, significant_digits)
+        body_metadata = _metadata_values(bodies, output_profile, significant_digits)
+        for i, body in enumerate(bodies):
+            geometry_file = resolved_geometry_files.get(body['geometryFile'], body['geometryFile'])
+            link_name = _link_name(body, geometry_file)
+            if link_name in group_transforms:
+                raise ValueError(f"Group name '{link_name}' collides with a link name")
+            body_link_names.add(link_name)
+
+            parent_link_name = body.get('group')
+            if parent_link_name is None:
+                parent_link_name = name
+            elements.extend(_rigid_body_to_urdf_elements(body, geometry_file, parent_link_name,
+                                                         scale_strs[i], collision_scale_strs[i],
+                                                         xyz_strs[i], rpy_strs[i], inertial_strs[i],
+                                                         body_metadata[i]))
+        yield elements
+
+def _json_data_to_urdf(data, package_index=None, path_rewrite_rules=None,
+                       output_profile="pretty", significant_digits=None, mass_properties=False):
+    if mass_properties:
+        data = add_mass_properties(data, package_index, path_rewrite_rules)
+
     # Create the root element of the URDF
     robot = Element('robot')
     robot.set('name', data['Name'])
@@ -83,86 +401,36 @@ def _json_str_to_urdf(json_data):
     # Create an empty root link
     root_link = SubElement(robot, 'link', {'name': data['Name']})
 
-    # Process each rigid body to create links and joints
-    for body in data['RigidBodies']:
-        # Extract file name without extension for link naming
-        file_name = body['geometryFile'].split('/')[-1].split('.')[0]
-        link_name = f"link_{file_name}_id_{body['id']}"
-
-        # Create link element
-        link = SubElement(robot, 'link', {'name': link_name})
+    # Process the groups and each rigid body to create links and joints
+    for elements in _iter_urdf_elements(data['Name'], [data], package_index, path_rewrite_rules,
+                                        output_profile, significant_digits):
+        robot.extend(elements)
 
-        # Visual element
-        visual = SubElement(link, 'visual')
-        geometry_v = SubElement(visual, 'geometry')
-        
-        if "primitives/box.obj" in body['geometryFile']:
-            box_v = SubElement(geometry_v, 'box')
-            box_v.set('size', ' '.join(map(str, body['scale'])))
-            
-        else:
-            mesh_v = SubElement(geometry_v, 'mesh')
-            mesh_v.set('filename', f"file://{body['geometryFile']}")
-            mesh_v.set('scale', ' '.join(map(str, body['scale'])))
+    # Convert the XML tree to a string in the requested output profile
+    urdf_str = dumps_urdf(robot, output_profile)
     
-        # Collision element
-        collision = SubElement(link, 'collision')
-        geometry_c = SubElement(collision, 'geometry')
-        
-        if "primitives/box.obj" in body['geometryFile']:
-            box_c = SubElement(geometry_c, 'box')
-            box_c.set('size', ' '.join(map(str, body['collisionObjectScale'])))
-        
-        else:
-            mesh_c = SubElement(geometry_c, 'mesh')
-            mesh_c.set('filename', f"file://{body['geometryFile']}")    
-            mesh_c.set('scale', ' '.join(map(str, body['collisionObjectScale'])))
-        
+    return urdf_str
 
+def _iter_urdf_chunks(name, scene_chunks, package_index=None, path_rewrite_rules=None,
+                      output_profile="pretty", significant_digits=None):
+    """
+    Generate a URDF string piece by piece from chunks of a JSON scene (see _iter_urdf_elements).
 
-        # Fixed joint connecting this link to the root link
-        joint = SubElement(robot, 'joint', {'name': f'joint_{link_name}', 'type': 'fixed'})
-        parent = SubElement(joint, 'parent', {'link': data['Name']})
-        child = SubElement(joint, 'child', {'link': link_name})
-        origin = SubElement(joint, 'origin')
-        origin.set('xyz', ' '.join(map(str, body['translation'])))
-        angle = body['rotationAngle']
-        axis = body['rotationAxis']
-        q = np.array([
-            np.cos(angle / 2),
-            np.sin(angle / 2) * axis[0],
-            np.sin(angle / 2) * axis[1],
-            np.sin(angle / 2) * axis[2]
-        ])
-        
-        roll = np.arctan2(2*(q[0]*q[1] + q[2]*q[3]), 1 - 2*(q[1]**2 + q[2]**2))
-        s2 = 2*(q[0]*q[2] - q[3]*q[1])
-        pitch = np.arcsin(np.clip(s2, -1.0, 1.0)) # Clipping to avoid NaN due to machine precision
-        yaw = np.arctan2(2*(q[0]*q[3] + q[1]*q[2]), 1 - 2*(q[2]**2 + q[3]**2))
-        
-        # print("angle:", angle)
-        # print("axis:", axis)
-        # print("q:", q)
-        # print(' '.join(map(str, [roll, pitch, yaw])))
-        origin.set('rpy', ' '.join(map(str, [roll, pitch, yaw])))
-
-        # Add other properties as metadata
-        for key, value in body.items():
-            if key not in ['id', 'geometryFile', 'translation', 'rotationAxis', 'rotationAngle', 'scale', 'collisionObjectScale']:
-                meta = SubElement(link, key)
-                meta.text = str(value)
-
-    # Convert the XML tree to a pretty-printed string
-    rough_string = tostring(robot, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    
-    urdf_str = reparsed.toprettyxml(indent="  ")
-    
-    return urdf_str
+    Only one chunk of bodies is held in memory at a time, so arbitrarily large scenes can be
+    streamed to a file. The numbers of each chunk are formatted in one vectorized call.
+    """
+    yield urdf_header(name, output_profile)
+    for elements in _iter_urdf_elements(name, scene_chunks, package_index, path_rewrite_rules,
+                                        output_profile, significant_digits):
+        yield ''.join(dumps_urdf_element(element, output_profile) for element in elements)
+    yield urdf_footer(output_profile)
 
 def json_to_urdf(input_file_path,
                 save_output=False, output_file_path=None,
-                visualize=False):
+                visualize=False,
+                package_index=None, path_rewrite_rules=None,
+                output_profile="pretty", significant_digits=None,
+                mass_properties=False):
     
     # Check if the input file exists
     if not os.path.exists(input_file_path):
@@ -174,7 +442,8 @@ def json_to_urdf(input_file_path,
         with open(input_file_path, "r") as file:
             json_str = file.read()
     
-        urdf_str = _json_str_to_urdf(json_str)
+        urdf_str = _json_str_to_urdf(json_str, package_index, path_rewrite_rules,
+                                     output_profile, significant_digits, mass_properties)
         
         if visualize:
             _visualize_urdf(urdf_str)
@@ -191,9 +460,13 @@ def json_to_urdf(input_file_path,
 
 def json_str_to_urdf(json_str, 
                      save_output=False, output_file_path=None,
-                     visualize=False):
+                     visualize=False,
+                     package_index=None, path_rewrite_rules=None,
+                     output_profile="pretty", significant_digits=None,
+                     mass_properties=False):
     
-    urdf_str = _json_str_to_urdf(json_str)
+    urdf_str = _json_str_to_urdf(json_str, package_index, path_rewrite_rules,
+                                 output_profile, significant_digits, mass_properties)
     
     if visualize:
         _visualize_urdf(urdf_str)
@@ -0,0 +1,266 @@
+import os
+
+import numpy as np
+
+from .geometry_paths import resolve_geometry_paths
+
+"""
+mass_properties.py: Mass properties of the rigid bodies of a scene, computed in bulk.
+
+Author: Burak Aksoy
+
+The JSON scene description gives the density of every body but no mass properties,
+so simulators and planners that need them recompute them from the meshes at load
+time, body by body. This module computes the volume, mass, center of mass and
+inertia tensor of all bodies of a scene at once, from their geometry scaled by
+their "scale" field:
+
+- Primitives (meshes/primitives/box.obj, cylinder.obj and sphere.obj) use closed
+  forms, vectorized over all bodies with the same primitive.
+- Other meshes are read from OBJ files and integrated with signed tetrahedron sums
+  over their faces, vectorized over the faces. The volume integrals of each unscaled
+  mesh are cached per file (until the file changes), and the scaled integrals of all
+  bodies using a mesh are derived from them at once.
+
+The center of mass and the inertia tensor (about the center of mass) are given in the
+frame of the body, i.e. the frame of its geometry file. Meshes are assumed closed;
+meshes with inward facing normals are handled by flipping the sign of their integrals.
+Static bodies ("isDynamic": 0) do not move in the simulation, so they are skipped and
+their meshes are not read.
+
+add_mass_properties adds the results to the bodies of a JSON scene as the "volume",
+"mass", "centerOfMass" and "inertia" ([ixx, ixy, ixz, iyy, iyz, izz], as in URDF)
+fields, which json_to_urdf writes as the <inertial> elements of the links.
+"""
+
+# Fields added to the JSON bodies by add_mass_properties
+MASS_PROPERTY_FIELDS = ("volume", "mass", "centerOfMass", "inertia")
+
+# Indices of the inertia tensor components in the order of the URDF inertia attributes
+_INERTIA_INDICES = ((0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2))
+
+_PRIMITIVES = ("box", "cylinder", "sphere")
+
+# Volume integrals of the unscaled meshes: file name -> (modification time, integrals)
+_mesh_integral_cache = {}
+
+
+def clear_mesh_cache():
+    """Clear the cached volume integrals of the meshes."""
+    _mesh_integral_cache.clear()
+
+
+def _primitive(geometry_file):
+    for primitive in _PRIMITIVES:
+        if f"primitives/{primitive}.obj" in geometry_file:
+            return primitive
+    return None
+
+
+def load_obj(fname):
+    """
+    Read the vertices and the faces of an OBJ mesh, polygons are split into triangles.
+
+    :type    fname: str
+    :param   fname: Path of the OBJ file.
+    :rtype:  (numpy.array, numpy.array)
+    :return: (V x 3 vertices, F x 3 vertex indices of the triangles)
+    """
+    vertices = []
+    triangles = []
+    with open(fname, "r") as file:
+        for line in file:
+            if line.startswith("v "):
+                vertices.append(line.split()[1:4])
+            elif line.startswith("f "):
+                # Vertex indices are 1-based, negative ones count from the last vertex
+                face = [int(token.split("/")[0]) for token in line.split()[1:]]
+                face = [index - 1 if index > 0 else len(vertices) + index for index in face]
+                triangles.extend([face[0], face[k], face[k + 1]] for k in range(1, len(face) - 1))
+    return np.array(vertices, dtype=float).reshape(-1, 3), np.array(triangles, dtype=int).reshape(-1, 3)
+
+
+def mesh_volume_integrals(vertices, triangles):
+    """
+    Volume integrals of a closed triangle mesh, as sums over the signed tetrahedra
+    formed by the origin and each triangle.
+
+    :type    vertices: numpy.array
+    :param   vertices: V x 3 vertices
+    :type    triangles: numpy.array
+    :param   triangles: F x 3 vertex indices of the triangles
+    :rtype:  (float, numpy.array, numpy.array)
+    :return: (volume, 3 first moments, 3 x 3 second moments, i.e. the integrals of 1, x and x x^T)
+    """
+    a = vertices[triangles[:, 0]]
+    b = vertices[triangles[:, 1]]
+    c = vertices[triangles[:, 2]]
+    s = a + b + c
+
+    # Six times the signed volume of each tetrahedron
+    det = np.einsum("ij,ij->i", a, np.cross(b, c))
+
+    volume = det.sum()/6.0
+    first_moment = np.dot(det, s)/24.0
+    second_moment = (np.einsum("i,ij,ik->jk", det, a, a) + np.einsum("i,ij,ik->jk", det, b, b)
+                     + np.einsum("i,ij,ik->jk", det, c, c) + np.einsum("i,ij,ik->jk", det, s, s))/120.0
+
+    # Inward facing normals give negative volumes
+    if volume < 0:
+        return -volume, -first_moment, -second_moment
+    return volume, first_moment, second_moment
+
+
+def primitive_volume_integrals(primitive, scales):
+    """
+    Volume integrals of many scaled primitives at once, in closed form.
+
+    The unscaled primitives are centered at the origin: a box with unit sides, a cylinder
+    along z with unit radius and length, and a sphere with unit radius.
+
+    :type    primitive: str
+    :param   primitive: "box", "cylinder" or "sphere"
+    :type    scales: numpy.array
+    :param   scales: N x 3 scales
+    :rtype:  (numpy.array, numpy.array, numpy.array)
+    :return: (N volumes, N x 3 first moments, N x 3 x 3 second moments)
+    """
+    scales = np.abs(np.asarray(scales, dtype=float).reshape(-1, 3))
+    squares = scales**2
+
+    if primitive == "box":
+        volumes = np.prod(scales, axis=1)
+        diagonals = squares/12.0
+    elif primitive == "cylinder":
+        volumes = np.pi*np.prod(scales, axis=1)
+        diagonals = squares*[0.25, 0.25, 1.0/12.0]
+    elif primitive == "sphere":
+        volumes = 4.0/3.0*np.pi*np.prod(scales, axis=1)
+        diagonals = squares/5.0
+    else:
+        raise ValueError(f"Unknown primitive: {primitive}, expected one of {_PRIMITIVES}")
+
+    second_moments = np.zeros((len(scales), 3, 3))
+    second_moments[:, [0, 1, 2], [0, 1, 2]] = volumes[:, np.newaxis]*diagonals
+    return volumes, np.zeros((len(scales), 3)), second_moments
+
+
+def _cached_mesh_volume_integrals(fname):
+    # Volume integrals of an unscaled mesh, None if the mesh can not be read
+    try:
+        mtime = os.stat(fname).st_mtime_ns
+    except OSError:
+        # Unresolved geometry files are reported by resolve_geometry_paths
+        return None
+
+    cached = _mesh_integral_cache.get(fname)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    if os.path.splitext(fname)[1].lower() != ".obj":
+        print("Mass properties are only computed for OBJ meshes, skipping: ", fname)
+        return None
+    try:
+        integrals = mesh_volume_integrals(*load_obj(fname))
+    except (OSError, ValueError, IndexError) as e:
+        print("Error reading mesh file: ", fname)
+        print(e)
+        return None
+
+    _mesh_integral_cache[fname] = (mtime, integrals)
+    return integrals
+
+
+def _scaled_volume_integrals(integrals, scales):
+    # Integrals over the mesh scaled by S = diag(scale): |det S| (V, S m, S C S)
+    volume, first_moment, second_moment = integrals
+    scales = np.asarray(scales, dtype=float).reshape(-1, 3)
+    dets = np.abs(np.prod(scales, axis=1))
+    return (dets*volume,
+            dets[:, np.newaxis]*scales*first_moment,
+            dets[:, np.newaxis, np.newaxis]*scales[:, :, np.newaxis]*second_moment*scales[:, np.newaxis, :])
+
+
+def compute_mass_properties(bodies, package_index=None, path_rewrite_rules=None):
+    """
+    Mass properties of many JSON rigid bodies at once.
+
+    Static bodies ("isDynamic": 0) and bodies whose geometry can not be read get NaN values.
+
+    :type    bodies: list
+    :param   bodies: JSON rigid body dictionaries with "geometryFile", "scale" and "density" fields.
+    :type    package_index: dict
+    :param   package_index: Package name -> directory, to resolve the mesh files (see geometry_paths.py).
+    :type    path_rewrite_rules: list of (str, str)
+    :param   path_rewrite_rules: (old_prefix, new_prefix) pairs applied to the mesh file names.
+    :rtype:  (numpy.array, numpy.array, numpy.array, numpy.array)
+    :return: (N volumes, N masses, N x 3 centers of mass, N x 3 x 3 inertia tensors about the centers of mass)
+    """
+    num_bodies = len(bodies)
+    volumes = np.full(num_bodies, np.nan)
+    first_moments = np.full((num_bodies, 3), np.nan)
+    second_moments = np.full((num_bodies, 3, 3), np.nan)
+    scales = np.array([body["scale"] for body in bodies], dtype=float).reshape(-1, 3)
+    densities = np.array([body.get("density", 1.0) for body in bodies], dtype=float)
+
+    # Bodies sharing a geometry file are computed together
+    body_indices = {}
+    for i, body in enumerate(bodies):
+        if body.get("isDynamic", 1):
+            body_indices.setdefault(body["geometryFile"], []).append(i)
+
+    resolved_geometry_files = resolve_geometry_paths([f for f in body_indices if _primitive(f) is None], "/",
+                                                     package_index=package_index,
+                                                     rewrite_rules=path_rewrite_rules,
+                                                     cache={})
+
+    for geometry_file, indices in body_indices.items():
+        primitive = _primitive(geometry_file)
+        if primitive is not None:
+            integrals = primitive_volume_integrals(primitive, scales[indices])
+        else:
+            mesh_integrals = _cached_mesh_volume_integrals(resolved_geometry_files[geometry_file])
+            if mesh_integrals is None:
+                continue
+            integrals = _scaled_volume_integrals(mesh_integrals, scales[indices])
+        volumes[indices], first_moments[indices], second_moments[indices] = integrals
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centers_of_mass = first_moments/volumes[:, np.newaxis]
+
+    # Second moments about the centers of mass, then I = tr(C) E - C
+    central_moments = second_moments - volumes[:, np.newaxis, np.newaxis]*np.einsum("ij,ik->ijk", centers_of_mass,
+                                                                                    centers_of_mass)
+    inertias = (np.trace(central_moments, axis1=1, axis2=2)[:, np.newaxis, np.newaxis]*np.eye(3)
+                - central_moments)*densities[:, np.newaxis, np.newaxis]
+    return volumes, densities*volumes, centers_of_mass, inertias
+
+
+def add_mass_properties(json_data, package_index=None, path_rewrite_rules=None):
+    """
+    Return a copy of JSON scene data with the mass properties of its bodies
+    ("volume", "mass", "centerOfMass" and "inertia" fields, see compute_mass_properties).
+
+    Static bodies and bodies whose geometry can not be read are left unchanged.
+    """
+    bodies = json_data["RigidBodies"]
+    volumes, masses, centers_of_mass, inertias = compute_mass_properties(bodies, package_index, path_rewrite_rules)
+
+    # Convert each array once, instead of element by element per body
+    rows, columns = zip(*_INERTIA_INDICES)
+    inertia_components = inertias[:, rows, columns].tolist()
+    volumes_list, masses_list, centers_of_mass_list = volumes.tolist(), masses.tolist(), centers_of_mass.tolist()
+
+    rigid_bodies = []
+    for i, body in enumerate(bodies):
+        rb_dict = dict(body)
+        if np.isfinite(volumes[i]):
+            rb_dict["volume"] = volumes_list[i]
+            rb_dict["mass"] = masses_list[i]
+            rb_dict["centerOfMass"] = centers_of_mass_list[i]
+            rb_dict["inertia"] = inertia_components[i]
+        rigid_bodies.append(rb_dict)
+
+    json_data = dict(json_data)
+    json_data["RigidBodies"] = rigid_bodies
+    return json_data
@@ -0,0 +1,294 @@
+import io
+import ast
+import json
+
+from functools import lru_cache
+
+import numpy as np
+
+from xml.etree.ElementTree import Element, tostring, canonicalize
+from xml.dom import minidom
+
+"""
+output_formats.py: Output profiles for the generated JSON and URDF strings.
+
+Author: Burak Aksoy
+
+Three output profiles are supported by every function that writes JSON or URDF:
+
+- "pretty" (default): The original output format. JSON is indented with 4 spaces,
+  URDF is pretty-printed by minidom and numbers are written with str(), i.e. with
+  full precision (e.g. 0.49999999999999994). Metadata strings are written as they
+  are, only strings that would be read back as other values (e.g. "42") are quoted.
+- "compact": No indentation or whitespace between elements. Floats are rounded to
+  a fixed number of significant digits, which makes the outputs considerably
+  smaller and faster to parse downstream.
+- "canonical": Like "compact", additionally JSON keys are sorted, negative zeros
+  are normalized and URDF is written in Canonical XML (C14N 2.0, sorted attributes),
+  so equal scenes produce byte-identical outputs and hashes are reproducible.
+
+Rounding and number formatting are done in bulk with NumPy: all floats of a scene
+are collected into one array and rounded/formatted at once.
+"""
+
+OUTPUT_PROFILES = ("pretty", "compact", "canonical")
+
+DEFAULT_SIGNIFICANT_DIGITS = 10
+
+# Powers of ten up to 1e22 are exact in double precision
+_MAX_EXACT_DECIMALS = 22
+
+
+def _check_output_profile(output_profile):
+    if output_profile not in OUTPUT_PROFILES:
+        raise ValueError(f"Unknown output profile: {output_profile}, expected one of {OUTPUT_PROFILES}")
+
+
+def round_significant(values, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+    """
+    Round an array of floats to a number of significant digits.
+
+    The rounded values are the doubles nearest to the rounded decimal values, so their
+    shortest representation (repr, json.dumps) has at most `significant_digits` digits.
+    Negative zeros are normalized to zero.
+
+    :type    values: array_like
+    :param   values: Floats to round.
+    :type    significant_digits: int
+    :param   significant_digits: Number of significant digits to keep.
+    :rtype:  numpy.array
+    :return: Rounded floats with the same shape as `values`.
+    """
+    values = np.asarray(values, dtype=float)
+    finite_nonzero = np.isfinite(values) & (values != 0)
+
+    exponents = np.zeros(values.shape, dtype=int)
+    exponents[finite_nonzero] = np.floor(np.log10(np.abs(values[finite_nonzero]))).astype(int)
+    decimals = significant_digits - 1 - exponents
+
+    exact = np.abs(decimals) <= _MAX_EXACT_DECIMALS
+    scale = 10.0 ** np.where(exact, np.abs(decimals), 0)
+    with np.errstate(invalid="ignore", over="ignore"):
+        rounded = np.where(decimals >= 0,
+                           np.round(values * scale) / scale,
+                           np.round(values / scale) * scale)
+    rounded = np.where(finite_nonzero, rounded, values)
+
+    # Extremely small or large magnitudes, rounded one by one
+    for index in zip(*np.nonzero(finite_nonzero & ~exact)):
+        rounded[index] = float(f"{values[index]:.{significant_digits}g}")
+
+    # Adding zero turns -0.0 into 0.0
+    return rounded + 0.0
+
+
+def format_numbers(values, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+    """Format an array of floats as strings with at most `significant_digits` significant digits."""
+    rounded = round_significant(values, significant_digits)
+    return np.char.mod(f"%.{significant_digits}g", rounded).tolist()
+
+
+def format_vectors(vectors, output_profile="pretty", significant_digits=None):
+    """
+    Format many number vectors at once as space separated strings, e.g. for URDF attributes.
+
+    The "pretty" profile keeps the original str() formatting of each number.
+    Other profiles format all numbers of all vectors in a single vectorized call.
+    """
+    _check_output_profile(output_profile)
+    if output_profile == "pretty":
+        return [' '.join(map(str, vector)) for vector in vectors]
+
+    if significant_digits is None:
+        significant_digits = DEFAULT_SIGNIFICANT_DIGITS
+
+    lengths = [len(vector) for vector in vectors]
+    flat = [float(value) for vector in vectors for value in vector]
+    formatted = format_numbers(flat, significant_digits)
+
+    strings = []
+    start = 0
+    for length in lengths:
+        strings.append(' '.join(formatted[start:start + length]))
+        start += length
+    return strings
+
+
+def _collect_floats(obj, floats):
+    if isinstance(obj, float):
+        floats.append(obj)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            _collect_floats(value, floats)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _collect_floats(value, floats)
+
+
+def _replace_floats(obj, rounded):
+    if isinstance(obj, float):
+        return next(rounded)
+    if isinstance(obj, dict):
+        return {key: _replace_floats(value, rounded) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_floats(value, rounded) for value in obj]
+    return obj
+
+
+def round_json_floats(json_data, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+    """Return a copy of JSON data with all floats rounded in one vectorized call."""
+    floats = []
+    _collect_floats(json_data, floats)
+    rounded = iter(round_significant(floats, significant_digits).tolist())
+    return _replace_floats(json_data, rounded)
+
+
+def format_metadata_value(value):
+    """
+    Text of a URDF metadata element (see json_to_urdf.py).
+
+    Strings are written as they are, unless parse_metadata_value would read them back
+    as another value (e.g. "42", "null" or "[1, 2]"), then they are quoted as JSON
+    strings. Other values are written as JSON.
+    """
+    if isinstance(value, str) and not _needs_quoting(value):
+        return value
+    return json.dumps(value)
+
+
+@lru_cache(maxsize=1024)
+def _needs_quoting(text):
+    # Bodies often share strings (comments, file names), so the checks are cached.
+    # Whitespace around the text may not survive the XML parser
+    if text != text.strip():
+        return True
+    return parse_metadata_value(text) != text
+
+
+def parse_metadata_value(text):
+    """
+    Value of a URDF metadata element, the inverse of format_metadata_value.
+
+    Files written by older versions contain str() values, i.e. Python literals
+    (e.g. True) and unquoted strings, which are read as well.
+    """
+    if text is None:
+        return ""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return text
+
+
+def dumps_json(json_data, output_profile="pretty", significant_digits=None):
+    """Serialize JSON scene data with the given output profile."""
+    _check_output_profile(output_profile)
+    if output_profile == "pretty":
+        return json.dumps(json_data, indent=4)
+
+    if significant_digits is None:
+        significant_digits = DEFAULT_SIGNIFICANT_DIGITS
+    json_data = round_json_floats(json_data, significant_digits)
+
+    if output_profile == "compact":
+        return json.dumps(json_data, separators=(",", ":"))
+    return json.dumps(json_data, separators=(",", ":"), sort_keys=True, ensure_ascii=True)
+
+
+def dumps_urdf(robot, output_profile="pretty"):
+    """Serialize a URDF ElementTree element with the given output profile."""
+    _check_output_profile(output_profile)
+    if output_profile == "pretty":
+        rough_string = tostring(robot, 'utf-8')
+        reparsed = minidom.parseString(rough_string)
+        return reparsed.toprettyxml(indent="  ")
+
+    rough_string = tostring(robot, encoding='unicode')
+    if output_profile == "compact":
+        return '<?xml version="1.0" ?>' + rough_string
+    return canonicalize(rough_string)
+
+
+# Streaming output, used to write large scenes piece by piece.
+# Each element of the pretty profile is written by minidom, indented one level
+# below the robot element, so that it matches the non-streamed output.
+
+def urdf_header(name, output_profile="pretty"):
+    """Opening of a streamed URDF: XML declaration, robot element and the root link."""
+    _check_output_profile(output_profile)
+    robot_tag = tostring(Element('robot', {'name': name}), encoding='unicode')[:-len(' />')] + '>'
+    root_link = dumps_urdf_element(Element('link', {'name': name}), output_profile)
+    if output_profile == "pretty":
+        return '<?xml version="1.0" ?>\n' + robot_tag + '\n' + root_link
+    if output_profile == "compact":
+        return '<?xml version="1.0" ?>' + robot_tag + root_link
+    return canonicalize(robot_tag + '</robot>')[:-len('</robot>')] + root_link
+
+
+def urdf_footer(output_profile="pretty"):
+    """Closing of a streamed URDF."""
+    _check_output_profile(output_profile)
+    return '</robot>\n' if output_profile == "pretty" else '</robot>'
+
+
+def dumps_urdf_element(element, output_profile="pretty"):
+    """Serialize a single child element of the robot element of a streamed URDF."""
+    _check_output_profile(output_profile)
+    if output_profile == "pretty":
+        writer = io.StringIO()
+        minidom.parseString(tostring(element, 'utf-8')).documentElement.writexml(writer, "  ", "  ", "\n")
+        return writer.getvalue()
+    if output_profile == "compact":
+        return tostring(element, encoding='unicode')
+    return canonicalize(tostring(element, encoding='unicode'))
+
+
+def iter_json_chunks(name, scene_chunks, output_profile="pretty", significant_digits=None):
+    """
+    Generate a JSON scene string piece by piece from chunks of a scene.
+
+    Each chunk is a dictionary with a list of "RigidBodies" and optionally a dictionary of
+    "RigidBodyGroups". The groups of all chunks are written after the bodies, so the
+    concatenated chunks are identical to dumps_json of the whole scene.
+    """
+    _check_output_profile(output_profile)
+    if output_profile != "pretty" and significant_digits is None:
+        significant_digits = DEFAULT_SIGNIFICANT_DIGITS
+
+    if output_profile == "pretty":
+        yield '{\n    "Name": ' + json.dumps(name) + ',\n    "RigidBodies": ['
+    else:
+        yield '{"Name":' + json.dumps(name) + ',"RigidBodies":['
+
+    first = True
+    groups = {}
+    for scene_chunk in scene_chunks:
+        bodies = scene_chunk["RigidBodies"]
+        groups.update(scene_chunk.get("RigidBodyGroups", {}))
+        if output_profile == "pretty":
+            body_strs = ['\n' + '\n'.join("        " + line for line in json.dumps(body, indent=4).split('\n'))
+                         for body in bodies]
+        else:
+            bodies = round_json_floats(list(bodies), significant_digits)
+            body_strs = [json.dumps(body, separators=(",", ":"), sort_keys=(output_profile == "canonical"))
+                         for body in bodies]
+        if body_strs:
+            yield ('' if first else ',') + ','.join(body_strs)
+            first = False
+
+    if output_profile == "pretty":
+        yield ']' if first else '\n    ]'
+        if groups:
+            yield ',\n    "RigidBodyGroups": ' + json.dumps(groups, indent=4).replace('\n', '\n    ')
+        yield '\n}'
+        return
+    yield ']'
+    if groups:
+        groups = round_json_floats(groups, significant_digits)
+        yield ',"RigidBodyGroups":' + json.dumps(groups, separators=(",", ":"),
+                                                  sort_keys=(output_profile == "canonical"))
+    yield '}'
@@ -0,0 +1,213 @@
+import os
+import json
+
+import numpy as np
+
+from .json_to_urdf import _json_data_to_urdf, _ordered_groups
+from .transforms import (axis_angle_to_rotation_matrices, rotation_matrices_to_axis_angle,
+                         pose_transform)
+from .output_formats import dumps_json
+
+"""
+scene.py: Array-backed in-memory representation of JSON scene descriptions.
+
+Author: Burak Aksoy
+
+The JSON scene description stores every rigid body as a dictionary. Operations that
+touch many bodies at once (generating variants, merging scenes, moving groups) are
+much faster on NumPy arrays than on lists of dictionaries, so a Scene keeps the
+geometric fields of all bodies in (N x 3) / (N,) arrays:
+
+- translations            <-> "translation"
+- rotation_axes           <-> "rotationAxis"
+- rotation_angles         <-> "rotationAngle"
+- scales                  <-> "scale"
+- collision_scales        <-> "collisionObjectScale"
+
+Every other field of a body (id, geometryFile, density, friction coefficients, ...)
+is kept as-is in the `bodies` list of dictionaries. The arrays are authoritative:
+when the scene is converted back to JSON data the array values overwrite the
+corresponding fields of the body dictionaries, keeping their original key order.
+
+The optional groups of the scene ("RigidBodyGroups", see json_to_urdf.py) are kept
+in the `groups` dictionary. Group poses are relative to their parent group or the
+root, body poses are always relative to the root.
+"""
+
+# JSON field name -> Scene array attribute name
+_ARRAY_FIELDS = {
+    "rotationAxis": "rotation_axes",
+    "rotationAngle": "rotation_angles",
+    "translation": "translations",
+    "scale": "scales",
+    "collisionObjectScale": "collision_scales",
+}
+
+
+class Scene:
+    def __init__(self, name, bodies,
+                 translations, rotation_axes, rotation_angles,
+                 scales, collision_scales, groups=None):
+        self.name = name
+        self.bodies = bodies
+        self.translations = np.asarray(translations, dtype=float).reshape(-1, 3)
+        self.rotation_axes = np.asarray(rotation_axes, dtype=float).reshape(-1, 3)
+        self.rotation_angles = np.asarray(rotation_angles, dtype=float).reshape(-1)
+        self.scales = np.asarray(scales, dtype=float).reshape(-1, 3)
+        self.collision_scales = np.asarray(collision_scales, dtype=float).reshape(-1, 3)
+        self.groups = {} if groups is None else groups
+
+    def __len__(self):
+        return len(self.bodies)
+
+    @classmethod
+    def from_json_data(cls, data):
+        bodies = data["RigidBodies"]
+        return cls(data["Name"], [dict(body) for body in bodies],
+                   translations=[body["translation"] for body in bodies],
+                   rotation_axes=[body["rotationAxis"] for body in bodies],
+                   rotation_angles=[body["rotationAngle"] for body in bodies],
+                   scales=[body["scale"] for body in bodies],
+                   collision_scales=[body.get("collisionObjectScale", body["scale"]) for body in bodies],
+                   groups={group_name: dict(group) for group_name, group in data.get("RigidBodyGroups", {}).items()})
+
+    @classmethod
+    def from_json_str(cls, json_str):
+        return cls.from_json_data(json.loads(json_str))
+
+    @classmethod
+    def from_json_file(cls, input_file_path):
+        with open(input_file_path, "r") as file:
+            return cls.from_json_data(json.load(file))
+
+    def copy(self):
+        return Scene(self.name, [dict(body) for body in self.bodies],
+                     self.translations.copy(), self.rotation_axes.copy(), self.rotation_angles.copy(),
+                     self.scales.copy(), self.collision_scales.copy(),
+                     {group_name: dict(group) for group_name, group in self.groups.items()})
+
+    def group_transforms(self):
+        """Transforms from the root to the frame of each group, as a dictionary of 4 x 4 arrays."""
+        transforms = {}
+        for group_name, group in _ordered_groups(self.groups, self.bodies):
+            parent_transform = transforms.get(group.get("parent"), np.eye(4))
+            transforms[group_name] = np.dot(parent_transform, pose_transform(group))
+        return transforms
+
+    def _transform_bodies(self, transform, body_mask=None):
+        # Move the bodies selected by the mask (all bodies by default) by a transform, in place
+        if body_mask is None:
+            body_mask = np.ones(len(self.bodies), dtype=bool)
+        rotation = transform[:3, :3]
+
+        # Pure translations keep the body rotations bit for bit
+        if np.array_equal(rotation, np.eye(3)):
+            self.translations[body_mask] += transform[:3, 3]
+            return
+
+        body_rotations = axis_angle_to_rotation_matrices(self.rotation_axes[body_mask], self.rotation_angles[body_mask])
+        self.rotation_axes[body_mask], self.rotation_angles[body_mask] = \
+            rotation_matrices_to_axis_angle(np.matmul(rotation, body_rotations))
+        self.translations[body_mask] = np.dot(self.translations[body_mask], rotation.T) + transform[:3, 3]
+
+    def _set_group_pose(self, group_name, transform):
+        # Pose fields of a group from its transform relative to its parent
+        group = self.groups.setdefault(group_name, {})
+        group["translation"] = transform[:3, 3].tolist()
+        if "rotationAxis" in group or "rotationAngle" in group or not np.array_equal(transform[:3, :3], np.eye(3)):
+            axes, angles = rotation_matrices_to_axis_angle(transform[:3, :3])
+            group["rotationAxis"] = axes[0].tolist()
+            group["rotationAngle"] = float(angles[0])
+
+    def transformed(self, pose):
+        """
+        Return a copy of the scene with all bodies moved by a pose.
+
+        :type    pose: numpy.array or dict
+        :param   pose: 4 x 4 homogeneous transform, or a dictionary with optional
+                       "translation", "rotationAxis" and "rotationAngle" fields as in the JSON.
+        """
+        transform = pose_transform(pose)
+        scene = self.copy()
+        scene._transform_bodies(transform)
+
+        # Groups below the root move with the scene, the others are relative to them
+        for group_name, group in _ordered_groups(scene.groups, scene.bodies):
+            if group.get("parent") is not None or np.array_equal(transform, np.eye(4)):
+                continue
+            if np.array_equal(transform[:3, :3], np.eye(3)):
+                scene.groups.setdefault(group_name, {})["translation"] = \
+                    (np.asarray(group.get("translation", [0.0, 0.0, 0.0]), dtype=float) + transform[:3, 3]).tolist()
+            else:
+                scene._set_group_pose(group_name, np.dot(transform, pose_transform(group)))
+        return scene
+
+    def with_group_pose(self, group_name, pose):
+        """
+        Return a copy of the scene with a group moved to a new pose relative to its parent.
+
+        The bodies and subgroups of the group move along. In the URDF of the scene only the
+        joint of the group changes.
+
+        :type    group_name: str
+        :param   group_name: Name of the group to move.
+        :type    pose: numpy.array or dict
+        :param   pose: 4 x 4 homogeneous transform, or a dictionary with optional
+                       "translation", "rotationAxis" and "rotationAngle" fields as in the JSON.
+        """
+        group_transforms = self.group_transforms()
+        if group_name not in group_transforms:
+            raise ValueError(f"Unknown group: {group_name}")
+
+        # Groups whose ancestors include the moved group
+        moved_groups = {group_name}
+        for name, group in _ordered_groups(self.groups, self.bodies):
+            if group.get("parent") in moved_groups:
+                moved_groups.add(name)
+
+        parent = self.groups.get(group_name, {}).get("parent")
+        parent_transform = np.eye(4) if parent is None else group_transforms[parent]
+        new_transform = np.dot(parent_transform, pose_transform(pose))
+        delta = np.dot(new_transform, np.linalg.inv(group_transforms[group_name]))
+
+        scene = self.copy()
+        scene._set_group_pose(group_name, pose_transform(pose))
+        scene._transform_bodies(delta, np.array([body.get("group") in moved_groups for body in self.bodies], dtype=bool))
+        return scene
+
+    def to_json_data(self):
+        # Convert each array once, instead of element by element per body
+        array_values = {field: getattr(self, attribute).tolist()
+                        for field, attribute in _ARRAY_FIELDS.items()}
+
+        rigid_bodies = []
+        for i, body in enumerate(self.bodies):
+            rb_dict = dict(body)
+            for field, values in array_values.items():
+                rb_dict[field] = values[i]
+            rigid_bodies.append(rb_dict)
+
+        json_data = {"Name": self.name, "RigidBodies": rigid_bodies}
+        if self.groups:
+            json_data["RigidBodyGroups"] = {group_name: dict(group) for group_name, group in self.groups.items()}
+        return json_data
+
+    def to_json_str(self, output_profile="pretty", significant_digits=None):
+        return dumps_json(self.to_json_data(), output_profile, significant_digits)
+
+    def to_urdf_str(self, output_profile="pretty", significant_digits=None, mass_properties=False):
+        return _json_data_to_urdf(self.to_json_data(),
+                                  output_profile=output_profile, significant_digits=significant_digits,
+                                  mass_properties=mass_properties)
+
+
+def _save_scene(scene, output_file_path, output_profile="pretty", significant_digits=None):
+    # Output format is chosen by the file extension, JSON unless it is .urdf
+    if os.path.splitext(output_file_path)[1].lower() == ".urdf":
+        out_str = scene.to_urdf_str(output_profile, significant_digits)
+    else:
+        out_str = scene.to_json_str(output_profile, significant_digits)
+
+    with open(output_file_path, "w") as file:
+        file.write(out_str)
+    return output_file_path
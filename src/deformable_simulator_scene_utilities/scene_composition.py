@@ -0,0 +1,191 @@
+import os
+import itertools
+
+import numpy as np
+
+from .scene import Scene
+from .json_to_urdf import _link_name, _ordered_groups, _iter_urdf_chunks
+from .urdf_to_json import urdf_to_json
+from .output_formats import iter_json_chunks
+from .mass_properties import add_mass_properties
+
+"""
+scene_composition.py: Merges many sub-scenes into one scene.
+
+Author: Burak Aksoy
+
+Environments are often built by combining scenes, e.g. a corridor, a table and
+a few fixtures. This module merges N sub-scenes without re-serializing them:
+
+- Each sub-scene is moved by its own pose offset, applied to its body arrays in bulk
+  (see Scene.transformed).
+- Body ids are remapped automatically. By default the ids of each sub-scene are
+  offset by the largest id used by the sub-scenes before it, which keeps the relative
+  ids within a sub-scene. With remap_ids=False the ids are kept as they are.
+- Link name collisions are resolved: the URDF link names are derived from the
+  geometry file names and the body ids (link_<file>_id_<id>), so a body whose link
+  name is already taken, or equal to the root link name, gets the next free id.
+- Groups of the sub-scenes (see json_to_urdf.py) are kept, a group whose name is
+  already used by a previous sub-scene is renamed with the index of its sub-scene.
+
+compose_scenes returns the merged Scene. write_composed_scene streams the merged
+JSON or URDF directly to a file, one sub-scene at a time, so composing hundreds of
+sub-scenes stays linear in the total number of bodies.
+
+Sub-scenes can be given as Scene objects, JSON scene dictionaries, or paths to
+JSON or URDF scene files.
+"""
+
+
+def _as_scene(scene):
+    if isinstance(scene, Scene):
+        return scene
+    if isinstance(scene, dict):
+        return Scene.from_json_data(scene)
+    if os.path.splitext(scene)[1].lower() == ".urdf":
+        return Scene.from_json_str(urdf_to_json(scene, preserve_hierarchy=True))
+    return Scene.from_json_file(scene)
+
+
+def _iter_composed_scenes(scenes, poses=None, name=None, remap_ids=True):
+    """
+    Generate the sub-scenes moved to their poses and with remapped ids.
+
+    Yields one Scene per sub-scene, which lets the callers either concatenate or stream them.
+    """
+    if poses is not None and len(poses) != len(scenes):
+        raise ValueError(f"Got {len(poses)} poses for {len(scenes)} scenes")
+
+    used_ids = set()
+    used_link_names = set()
+    used_group_names = set()
+    max_used_id = 0
+    next_free_id = 1
+
+    for k, scene in enumerate(scenes):
+        scene = _as_scene(scene)
+        if name is None:
+            name = scene.name
+
+        scene = scene.transformed(None if poses is None else poses[k])
+
+        scene_id_offset = max_used_id if remap_ids else 0
+
+        group_names = {}
+        for group_name, _ in _ordered_groups(scene.groups, scene.bodies):
+            new_group_name = group_name
+            suffix = k
+            while new_group_name in used_group_names:
+                new_group_name = f"{group_name}_{suffix}"
+                suffix += 1
+            if new_group_name != group_name:
+                print(f"Renaming group {group_name} of scene {k} to {new_group_name}")
+            group_names[group_name] = new_group_name
+            used_group_names.add(new_group_name)
+        if any(group_name != new_group_name for group_name, new_group_name in group_names.items()):
+            scene.groups = {group_names[group_name]: group for group_name, group in scene.groups.items()}
+            for group in scene.groups.values():
+                if group.get("parent") is not None:
+                    group["parent"] = group_names[group["parent"]]
+            for body in scene.bodies:
+                if body.get("group") is not None:
+                    body["group"] = group_names.get(body["group"], body["group"])
+
+        for body in scene.bodies:
+            body["id"] += scene_id_offset
+            link_name = _link_name(body)
+            if body["id"] in used_ids or link_name in used_link_names or link_name == name:
+                while next_free_id in used_ids or _link_name(dict(body, id=next_free_id)) in used_link_names \
+                        or _link_name(dict(body, id=next_free_id)) == name:
+                    next_free_id += 1
+                print(f"Renaming body {body['id']} of scene {k} ({link_name}) to id {next_free_id}")
+                body["id"] = next_free_id
+                link_name = _link_name(body)
+            used_ids.add(body["id"])
+            used_link_names.add(link_name)
+            max_used_id = max(max_used_id, body["id"])
+
+        yield name, scene
+
+
+def compose_scenes(scenes, poses=None, name=None, remap_ids=True):
+    """
+    Merge many scenes into one Scene.
+
+    :type    scenes: list
+    :param   scenes: Scene objects, JSON scene dictionaries or JSON/URDF file paths.
+    :type    poses: list
+    :param   poses: Optional pose offset of each scene, a 4 x 4 transform or a dictionary with
+                    "translation", "rotationAxis" and "rotationAngle" fields, None for no offset.
+    :type    name: str
+    :param   name: Name of the merged scene (root link), defaults to the name of the first scene.
+    :type    remap_ids: bool
+    :param   remap_ids: Offset the ids of each scene past the ids of the previous scenes.
+    :rtype:  Scene
+    :return: The merged scene.
+    """
+    composed = list(_iter_composed_scenes(scenes, poses, name, remap_ids))
+    if not composed:
+        return Scene(name, [], np.zeros((0, 3)), np.zeros((0, 3)), np.zeros(0),
+                     np.zeros((0, 3)), np.zeros((0, 3)))
+
+    sub_scenes = [scene for _, scene in composed]
+    groups = {}
+    for scene in sub_scenes:
+        groups.update(scene.groups)
+    # Concatenate each array once, instead of appending scene by scene
+    return Scene(composed[0][0], [body for scene in sub_scenes for body in scene.bodies],
+                 np.concatenate([scene.translations for scene in sub_scenes]),
+                 np.concatenate([scene.rotation_axes for scene in sub_scenes]),
+                 np.concatenate([scene.rotation_angles for scene in sub_scenes]),
+                 np.concatenate([scene.scales for scene in sub_scenes]),
+                 np.concatenate([scene.collision_scales for scene in sub_scenes]),
+                 groups)
+
+
+def write_composed_scene(scenes, output_file_path, poses=None, name=None, remap_ids=True,
+                         output_profile="pretty", significant_digits=None,
+                         package_index=None, path_rewrite_rules=None, mass_properties=False):
+    """
+    Merge many scenes and stream the result to a JSON or URDF file (chosen by its extension).
+
+    Only one sub-scene is held in memory at a time. See compose_scenes for the arguments
+    and output_formats.py for the output profiles. With mass_properties, the mass properties
+    of the dynamic bodies are computed one sub-scene at a time (see mass_properties.py).
+    """
+    if output_file_path == "" or output_file_path is None:
+        print("ERROR: No output file path provided")
+        return None
+
+    composed = _iter_composed_scenes(scenes, poses, name, remap_ids)
+
+    # The scene name is known once the first sub-scene is loaded
+    first = next(composed, None)
+    if first is None:
+        print("ERROR: No scenes to compose")
+        return None
+    name = first[0]
+
+    def scene_chunks():
+        for _, scene in itertools.chain([first], composed):
+            json_data = scene.to_json_data()
+            if mass_properties:
+                json_data = add_mass_properties(json_data, package_index, path_rewrite_rules)
+            yield json_data
+
+    if os.path.splitext(output_file_path)[1].lower() == ".urdf":
+        chunks = _iter_urdf_chunks(name, scene_chunks(), package_index, path_rewrite_rules,
+                                   output_profile, significant_digits)
+    else:
+        chunks = iter_json_chunks(name, scene_chunks(), output_profile, significant_digits)
+
+    try:
+        with open(output_file_path, "w") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        print("Saved composed scene to file: ", output_file_path)
+    except OSError as e:
+        print("Error saving composed scene to file: ", output_file_path)
+        print(e)
+        return None
+    return output_file_path
@@ -0,0 +1,277 @@
+import os
+import ast
+import json
+import operator
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from .scene import Scene, _save_scene
+from .mass_properties import MASS_PROPERTY_FIELDS
+
+"""
+scene_templates.py: Parametric scene templates for generating families of scene variants.
+
+Author: Burak Aksoy
+
+Many scenes differ from each other only by a few parameters, e.g. the
+`example/l_shape_corridor_width_*` scenes only differ by the corridor width.
+Instead of editing a URDF and running a full conversion for each variant, a
+template describes a base scene plus named parameters and expressions for the
+translation and scale of the bodies that depend on them. Expanding a template
+evaluates every expression once for all requested parameter values at the same
+time (NumPy vectorized) and transforms the Scene arrays in bulk.
+
+Template format (JSON), see example/l_shape_corridor_template.json:
+{
+    "BaseScene": "l_shape_corridor_width_0.7.json",
+    "Parameters": {"width": 0.7},
+    "Bodies": {
+        "2": {
+            "translation": ["-0.05 - width / 2", "2.85 - width", null],
+            "scale": ["5.9 - width", null, null]
+        }
+    }
+}
+
+- "BaseScene" is a JSON scene file path (relative to the template file) or an inline scene.
+- "Parameters" maps the parameter names to their default values.
+- "Bodies" maps body ids of the base scene to the expressions of their fields.
+- Each of "translation", "scale" and "collisionObjectScale" is a list of three
+  components; a component is either an expression string, a number or null
+  (keep the base scene value).
+- Expressions may use numbers, the parameter names, `base` (the base scene value of
+  the same component), `pi`, the arithmetic operators + - * / // % ** and calls of
+  the NumPy functions listed in _EXPRESSION_FUNCTIONS. They are evaluated by a small
+  AST interpreter that rejects anything else, not by eval, so templates can not run code.
+- If "collisionObjectScale" is not given but "scale" is, the collision scale
+  follows the scale expressions for bodies whose base collision scale equals
+  their base scale (as generated by urdf_to_json).
+- Bodies with a templated "scale" lose the mass properties of the base scene
+  ("volume", "mass", "centerOfMass" and "inertia"), which only hold for the base
+  scale. They can be recomputed with mass_properties=True when writing the scenes.
+
+Usage:
+    template = load_scene_template("example/l_shape_corridor_template.json")
+    scenes = expand_scene_template(template, {"width": np.linspace(0.5, 1.5, 1000)})
+    write_scene_variants(scenes, [f"corridor_{i}.urdf" for i in range(len(scenes))])
+"""
+
+_TEMPLATE_FIELDS = {
+    "translation": "translations",
+    "scale": "scales",
+    "collisionObjectScale": "collision_scales",
+}
+
+_EXPRESSION_FUNCTIONS = {
+    "pi": np.pi,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan, "arctan2": np.arctan2,
+    "sqrt": np.sqrt, "abs": np.abs, "exp": np.exp, "log": np.log,
+    "minimum": np.minimum, "maximum": np.maximum, "clip": np.clip,
+    "floor": np.floor, "ceil": np.ceil, "round": np.round,
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos, ast.USub: operator.neg,
+}
+
+
+def _evaluate_node(node, namespace):
+    if isinstance(node, ast.Expression):
+        return _evaluate_node(node.body, namespace)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        # Floats overflow, while Python integers would grow without bound (e.g. 9**9**9**9)
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        if node.id not in namespace:
+            raise ValueError(f"Unknown name in template expression: {node.id}")
+        return namespace[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        return _BINARY_OPERATORS[type(node.op)](_evaluate_node(node.left, namespace),
+                                                _evaluate_node(node.right, namespace))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_evaluate_node(node.operand, namespace))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords \
+            and callable(_EXPRESSION_FUNCTIONS.get(node.func.id)):
+        return _EXPRESSION_FUNCTIONS[node.func.id](*[_evaluate_node(arg, namespace) for arg in node.args])
+    raise ValueError(f"Unsupported template expression: {ast.dump(node)}")
+
+
+def _evaluate_expression(expression, namespace):
+    """
+    Evaluate a template expression.
+
+    Only numbers, the names in `namespace`, arithmetic operators and calls of the functions
+    in _EXPRESSION_FUNCTIONS are allowed, anything else raises a ValueError. Numbers are
+    evaluated as floats, results out of the float range raise a ValueError as well.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid template expression: {expression}") from e
+    try:
+        return _evaluate_node(tree, namespace)
+    except OverflowError as e:
+        raise ValueError(f"Template expression out of range: {expression}") from e
+
+
+def load_scene_template(input_file_path):
+    """Load a template file, an inline "BaseScene" path is resolved relative to it."""
+    with open(input_file_path, "r") as file:
+        template = json.load(file)
+
+    if isinstance(template.get("BaseScene"), str):
+        template_dir = os.path.dirname(os.path.abspath(input_file_path))
+        template["BaseScene"] = os.path.join(template_dir, template["BaseScene"])
+    return template
+
+
+def _base_scene(template):
+    base_scene = template["BaseScene"]
+    if isinstance(base_scene, Scene):
+        return base_scene
+    if isinstance(base_scene, dict):
+        return Scene.from_json_data(base_scene)
+    return Scene.from_json_file(base_scene)
+
+
+def _parameter_arrays(template, parameter_values):
+    # Parameter values default to the template defaults, all are broadcast to a common length
+    parameters = dict(template.get("Parameters", {}))
+    for name in parameter_values:
+        if name not in parameters:
+            raise ValueError(f"Unknown template parameter: {name}")
+    parameters.update(parameter_values)
+
+    arrays = {name: np.atleast_1d(np.asarray(value, dtype=float)) for name, value in parameters.items()}
+    num_variants = max([len(value) for value in arrays.values()], default=1)
+    for name, value in arrays.items():
+        if len(value) not in (1, num_variants):
+            raise ValueError(f"Parameter '{name}' has {len(value)} values, expected 1 or {num_variants}")
+        arrays[name] = np.broadcast_to(value, (num_variants,))
+    return arrays, num_variants
+
+
+def expand_scene_template(template, parameter_values=None):
+    """
+    Expand a scene template into concrete scenes.
+
+    :type    template: dict
+    :param   template: Template, see the module documentation and load_scene_template.
+    :type    parameter_values: dict
+    :param   parameter_values: Parameter name -> value or sequence of values. All sequences
+                               must have the same length N; missing parameters use their defaults.
+    :rtype:  list of Scene
+    :return: N scenes. They share the body metadata dictionaries of the base scene,
+             use Scene.copy() before editing the metadata of a single variant.
+    """
+    base_scene = _base_scene(template)
+    bodies = list(base_scene.bodies)
+    parameters, num_variants = _parameter_arrays(template, parameter_values or {})
+    index_of_id = {body["id"]: i for i, body in enumerate(base_scene.bodies)}
+
+    # (num_variants x num_bodies x 3) arrays, initialized with the base scene values
+    variant_arrays = {
+        attribute: np.repeat(getattr(base_scene, attribute)[np.newaxis], num_variants, axis=0)
+        for attribute in _TEMPLATE_FIELDS.values()
+    }
+
+    for body_id, expressions in template.get("Bodies", {}).items():
+        body_id = int(body_id)
+        if body_id not in index_of_id:
+            raise ValueError(f"Template refers to unknown body id: {body_id}")
+        i = index_of_id[body_id]
+
+        expressions = dict(expressions)
+        if "scale" in expressions and any(field in bodies[i] for field in MASS_PROPERTY_FIELDS):
+            # The mass properties of the base scale are out of date in the variants
+            bodies[i] = {key: value for key, value in bodies[i].items() if key not in MASS_PROPERTY_FIELDS}
+        if ("collisionObjectScale" not in expressions and "scale" in expressions
+                and np.array_equal(base_scene.scales[i], base_scene.collision_scales[i])):
+            expressions["collisionObjectScale"] = expressions["scale"]
+
+        for field, components in expressions.items():
+            if field not in _TEMPLATE_FIELDS:
+                raise ValueError(f"Field '{field}' of body {body_id} cannot be templated")
+            values = variant_arrays[_TEMPLATE_FIELDS[field]]
+
+            for axis, component in enumerate(components):
+                if component is None:
+                    continue
+                if isinstance(component, str):
+                    namespace = dict(_EXPRESSION_FUNCTIONS)
+                    namespace.update(parameters)
+                    namespace["base"] = getattr(base_scene, _TEMPLATE_FIELDS[field])[i, axis]
+                    component = _evaluate_expression(component, namespace)
+                values[:, i, axis] = component
+
+    scenes = []
+    for v in range(num_variants):
+        # Views into the variant arrays, no per-variant copies
+        scenes.append(Scene(base_scene.name, bodies,
+                            variant_arrays["translations"][v],
+                            base_scene.rotation_axes, base_scene.rotation_angles,
+                            variant_arrays["scales"][v], variant_arrays["collision_scales"][v],
+                            base_scene.groups))
+    return scenes
+
+
+def write_scene_variants(scenes, output_file_paths, max_workers=None,
+                         output_profile="pretty", significant_digits=None):
+    """
+    Write scenes to files in parallel worker processes.
+
+    The output format of each file is chosen by its extension: URDF for `.urdf`, JSON otherwise.
+    See output_formats.py for the output profiles.
+    Returns the list of paths that were written successfully.
+
+    The workers import the main module under the "spawn" (default on macOS and Windows)
+    and "forkserver" start methods, so scripts calling this function must do so under
+    an `if __name__ == "__main__":` guard.
+    """
+    if len(scenes) != len(output_file_paths):
+        print("ERROR: Number of scenes and output file paths do not match")
+        return []
+
+    saved_paths = []
+    chunksize = max(1, len(scenes) // (4 * (max_workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        save_scene_variant = partial(_save_scene_variant,
+                                     output_profile=output_profile, significant_digits=significant_digits)
+        results = executor.map(save_scene_variant, scenes, output_file_paths, chunksize=chunksize)
+        for output_file_path, error in zip(output_file_paths, results):
+            if error is None:
+                saved_paths.append(output_file_path)
+            else:
+                print("Error saving scene to file: ", output_file_path)
+                print(error)
+
+    print(f"Saved {len(saved_paths)} of {len(scenes)} scene variants")
+    return saved_paths
+
+
+def _save_scene_variant(scene, output_file_path, output_profile="pretty", significant_digits=None):
+    # Runs in a worker process, errors are returned instead of raised
+    try:
+        _save_scene(scene, output_file_path, output_profile, significant_digits)
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def generate_scene_variants(template, parameter_values, output_file_paths, max_workers=None,
+                            output_profile="pretty", significant_digits=None):
+    """Expand a template (dict or template file path) and write the variants, see write_scene_variants."""
+    if isinstance(template, str):
+        template = load_scene_template(template)
+    scenes = expand_scene_template(template, parameter_values)
+    return write_scene_variants(scenes, output_file_paths, max_workers,
+                                output_profile, significant_digits)
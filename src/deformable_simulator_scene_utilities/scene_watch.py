@@ -0,0 +1,405 @@
+import os
+import sys
+import stat
+import time
+import select
+import struct
+import hashlib
+import tempfile
+import ctypes
+import ctypes.util
+
+import numpy as np
+
+from .json_to_urdf import _json_str_to_urdf
+from .urdf_to_json import _load_urdf, _urdf_to_json, primitives_dir
+from .output_formats import _check_output_profile
+
+"""
+scene_watch.py: Keeps generated URDF/JSON files in sync with the scene files they are generated from.
+
+Author: Burak Aksoy
+
+During scene editing the JSON -> URDF (or URDF -> JSON) conversion has to be rerun after
+every change. A SceneWatcher monitors a set of input scene files and regenerates the
+outputs of the inputs that changed:
+
+- Changes are detected with Linux inotify (through ctypes, no extra dependencies),
+  or by polling the modification times of all inputs in one batch on other platforms.
+  Inputs in directories that inotify can not watch are polled.
+- Bursts of events (editors often write a file in several steps) are debounced: an input
+  is only converted once it has not changed for `debounce` seconds.
+- Only the outputs of the changed inputs are regenerated. Inputs whose content did not
+  change (e.g. touched or saved without edits) are skipped, and outputs are only replaced
+  if the generated content differs from the file on disk.
+- Outputs are written to a temporary file in the same directory and atomically renamed
+  over the old output, so running consumers never read a half-written file. The output
+  keeps the permissions of the old output (new outputs get the default 0o666 & ~umask).
+- Invalid inputs (e.g. a JSON file in the middle of an edit) are reported and keep the
+  previous output.
+- The latency from the last change of an input (its modification time, so it includes
+  the debounce and polling delays) to the replaced output is tracked per regeneration and
+  summarized by latency_report(). Outputs regenerated by start() are not counted.
+
+The conversion direction is chosen by the input extension: .json inputs generate URDF
+outputs, .urdf inputs generate JSON outputs.
+
+Usage:
+    watcher = SceneWatcher({"scene.json": "scene.urdf"}, output_profile="compact")
+    watcher.run()  # until Ctrl+C
+"""
+
+# inotify event masks, see <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+# Options passed to the converters, mass_properties only applies to JSON inputs
+# and preserve_hierarchy only to URDF inputs
+_CONVERSION_OPTIONS = ("output_profile", "significant_digits", "package_index", "path_rewrite_rules",
+                       "mass_properties", "preserve_hierarchy")
+
+
+def _load_libc_inotify():
+    # None if inotify is not available on this platform
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def _output_mode(output_file_path):
+    # Permissions of the existing output, or the ones open() would give a new file
+    try:
+        return stat.S_IMODE(os.stat(output_file_path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _atomic_write(output_file_path, out_str):
+    # Write next to the output and rename it over the output, which is atomic on POSIX.
+    # mkstemp creates the file with mode 0o600, so the output permissions are restored first
+    output_dir = os.path.dirname(os.path.abspath(output_file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix="." + os.path.basename(output_file_path) + ".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(out_str)
+            file.flush()
+            os.fchmod(file.fileno(), _output_mode(output_file_path))
+            os.fsync(file.fileno())
+        os.replace(tmp_path, output_file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _convert_scene_file(input_file_path, input_bytes, conversion_options):
+    # Conversion direction by input extension. JSON is converted from the bytes that were hashed,
+    # URDF is loaded from the file so that relative mesh paths are found by yourdfpy
+    if os.path.splitext(input_file_path)[1].lower() == ".urdf":
+        urdf_model, link_metadata = _load_urdf(input_file_path)
+        return _urdf_to_json(urdf_model, primitives_dir,
+                             package_index=conversion_options.get("package_index"),
+                             path_rewrite_rules=conversion_options.get("path_rewrite_rules"),
+                             output_profile=conversion_options.get("output_profile", "pretty"),
+                             significant_digits=conversion_options.get("significant_digits"),
+                             link_metadata=link_metadata,
+                             preserve_hierarchy=conversion_options.get("preserve_hierarchy", False))
+    return _json_str_to_urdf(input_bytes.decode("utf-8"),
+                             package_index=conversion_options.get("package_index"),
+                             path_rewrite_rules=conversion_options.get("path_rewrite_rules"),
+                             output_profile=conversion_options.get("output_profile", "pretty"),
+                             significant_digits=conversion_options.get("significant_digits"),
+                             mass_properties=conversion_options.get("mass_properties", False))
+
+
+class SceneWatcher:
+    """
+    Watches input scene files and regenerates their outputs, see the module documentation.
+
+    :type    file_pairs: dict or list of (str, str)
+    :param   file_pairs: Input file -> output file. An input may have several outputs.
+    :type    debounce: float
+    :param   debounce: Seconds an input must be unchanged before it is converted.
+    :type    poll_interval: float
+    :param   poll_interval: Seconds between modification time checks when polling.
+    :type    use_inotify: bool
+    :param   use_inotify: Force (True) or disable (False) inotify, by default it is used if available.
+    :param   conversion_options: output_profile, significant_digits, package_index,
+                                 path_rewrite_rules, mass_properties (JSON inputs) and
+                                 preserve_hierarchy (URDF inputs), passed to the converters.
+    """
+
+    def __init__(self, file_pairs, debounce=0.2, poll_interval=0.5, use_inotify=None,
+                 **conversion_options):
+        if isinstance(file_pairs, dict):
+            file_pairs = file_pairs.items()
+
+        self.outputs = {}
+        for input_file_path, output_file_path in file_pairs:
+            self.outputs.setdefault(os.path.abspath(input_file_path), []).append(os.path.abspath(output_file_path))
+
+        all_outputs = {output for outputs in self.outputs.values() for output in outputs}
+        if all_outputs & set(self.outputs):
+            raise ValueError("A watched file can not be both an input and an output, "
+                             f"got {sorted(all_outputs & set(self.outputs))}")
+
+        unknown_options = sorted(set(conversion_options) - set(_CONVERSION_OPTIONS))
+        if unknown_options:
+            raise TypeError(f"Unknown conversion options: {unknown_options}, expected some of {_CONVERSION_OPTIONS}")
+        _check_output_profile(conversion_options.get("output_profile", "pretty"))
+
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.conversion_options = conversion_options
+
+        self.latencies = []
+        self._pending = {}        # input -> last event time
+        self._input_hashes = {}   # input -> hash of the content the outputs were generated from
+        self._mtimes = {}         # input -> (mtime_ns, size), for polling
+
+        self._libc = _load_libc_inotify() if use_inotify in (None, True) else None
+        if use_inotify and self._libc is None:
+            raise RuntimeError("inotify is not available on this platform")
+        self._inotify_fd = None
+        self._watch_dirs = {}     # watch descriptor -> directory
+        self._polled_inputs = []  # inputs in directories inotify could not watch
+
+    def start(self, sync=True):
+        """Start watching. With sync, outputs that are missing or older than their input are regenerated."""
+        if self._libc is not None and self._inotify_fd is None:
+            self._start_inotify()
+
+        self._mtimes = self._stat_inputs()
+        if sync:
+            # Inputs may have changed long before, so these regenerations have no latency
+            for input_file_path, outputs in self.outputs.items():
+                input_stat = self._mtimes.get(input_file_path)
+                if input_stat is None:
+                    continue
+                if any(not os.path.exists(output) or os.stat(output).st_mtime_ns < input_stat[0]
+                       for output in outputs):
+                    self._pending.pop(input_file_path, None)
+                    self._regenerate(input_file_path, record_latency=False)
+        return self
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+            self._watch_dirs = {}
+            self._polled_inputs = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start_inotify(self):
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._inotify_fd = fd
+
+        # Watch the directories, editors often replace files by renaming new ones over them
+        for watch_dir in {os.path.dirname(input_file_path) for input_file_path in self.outputs}:
+            wd = self._libc.inotify_add_watch(fd, watch_dir.encode(), _IN_WATCH_MASK)
+            if wd < 0:
+                print("Error watching directory, polling its inputs instead: ", watch_dir)
+                self._polled_inputs.extend(input_file_path for input_file_path in self.outputs
+                                           if os.path.dirname(input_file_path) == watch_dir)
+                continue
+            self._watch_dirs[wd] = watch_dir
+
+    def _stat_inputs(self, input_file_paths=None):
+        # One pass over the inputs (all by default), missing inputs are left out
+        stats = {}
+        for input_file_path in (self.outputs if input_file_paths is None else input_file_paths):
+            try:
+                stat = os.stat(input_file_path)
+            except OSError:
+                continue
+            stats[input_file_path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def _mark_changed(self, input_file_path, now):
+        # The debounce restarts with every event of a burst
+        self._pending[input_file_path] = now
+
+    def _read_inotify_events(self, timeout):
+        ready, _, _ = select.select([self._inotify_fd], [], [], timeout)
+        if not ready:
+            return
+        now = time.time()
+        try:
+            buffer = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, name_length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = buffer[offset:offset + name_length].rstrip(b"\0").decode(errors="replace")
+            offset += name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                # Events were lost, fall back to comparing all inputs once
+                self._poll_mtimes(now)
+                continue
+            input_file_path = os.path.join(self._watch_dirs.get(wd, ""), name)
+            if input_file_path in self.outputs:
+                self._mark_changed(input_file_path, now)
+
+    def _poll_mtimes(self, now, input_file_paths=None):
+        stats = self._stat_inputs(input_file_paths)
+        for input_file_path, stat in stats.items():
+            if self._mtimes.get(input_file_path) != stat:
+                self._mark_changed(input_file_path, now)
+        if input_file_paths is None:
+            self._mtimes = stats
+            return
+        for input_file_path in input_file_paths:
+            if input_file_path in stats:
+                self._mtimes[input_file_path] = stats[input_file_path]
+            else:
+                self._mtimes.pop(input_file_path, None)
+
+    def wait_for_changes(self, timeout):
+        """Wait up to `timeout` seconds for changes of the inputs and record them as pending."""
+        if self._inotify_fd is not None:
+            if self._polled_inputs:
+                timeout = min(timeout, self.poll_interval)
+            self._read_inotify_events(timeout)
+            if self._polled_inputs:
+                self._poll_mtimes(time.time(), self._polled_inputs)
+        else:
+            time.sleep(timeout)
+            self._poll_mtimes(time.time())
+
+    def process_pending(self):
+        """Regenerate the outputs of the pending inputs that have settled, returns the replaced outputs."""
+        now = time.time()
+        settled = [input_file_path for input_file_path, last_event_time in self._pending.items()
+                   if now - last_event_time >= self.debounce]
+
+        replaced = []
+        for input_file_path in settled:
+            del self._pending[input_file_path]
+            replaced.extend(self._regenerate(input_file_path))
+        return replaced
+
+    def _regenerate(self, input_file_path, record_latency=True):
+        try:
+            with open(input_file_path, "rb") as file:
+                input_bytes = file.read()
+                # Time of the last change of the content that is converted
+                change_time = os.fstat(file.fileno()).st_mtime_ns/1e9
+        except OSError:
+            # Deleted or being replaced, a new event follows if it comes back
+            return []
+
+        input_hash = hashlib.sha1(input_bytes).hexdigest()
+        outputs = self.outputs[input_file_path]
+        if self._input_hashes.get(input_file_path) == input_hash \
+                and all(os.path.exists(output) for output in outputs):
+            return []
+
+        start = time.time()
+        try:
+            out_str = _convert_scene_file(input_file_path, input_bytes, self.conversion_options)
+        except Exception as e:
+            print("Error converting scene file, keeping the previous output: ", input_file_path)
+            print(e)
+            return []
+
+        replaced = []
+        for output_file_path in outputs:
+            try:
+                with open(output_file_path, "r") as file:
+                    unchanged = file.read() == out_str
+            except OSError:
+                unchanged = False
+            if unchanged:
+                continue
+            try:
+                _atomic_write(output_file_path, out_str)
+            except OSError as e:
+                print("Error saving file: ", output_file_path)
+                print(e)
+                continue
+            replaced.append(output_file_path)
+
+        self._input_hashes[input_file_path] = input_hash
+        if replaced:
+            end = time.time()
+            message = (f"Regenerated {', '.join(os.path.basename(output) for output in replaced)} "
+                       f"from {os.path.basename(input_file_path)}: conversion {(end - start) * 1000:.1f} ms")
+            if record_latency:
+                latency = end - change_time
+                self.latencies.append(latency)
+                message += f", change to updated file {latency * 1000:.1f} ms"
+            print(message)
+        return replaced
+
+    def latency_report(self):
+        """Statistics of the change-to-updated-file latencies in seconds."""
+        if not self.latencies:
+            return {"count": 0}
+        latencies = np.array(self.latencies)
+        return {
+            "count": len(latencies),
+            "mean": float(latencies.mean()),
+            "median": float(np.median(latencies)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+            "last": float(latencies[-1]),
+        }
+
+    def run(self, duration=None):
+        """Watch and regenerate until interrupted (Ctrl+C) or for `duration` seconds."""
+        self.start()
+        mode = "inotify" if self._inotify_fd is not None else f"polling every {self.poll_interval} s"
+        print(f"Watching {len(self.outputs)} scene files ({mode}), press Ctrl+C to stop")
+
+        end_time = None if duration is None else time.time() + duration
+        try:
+            while end_time is None or time.time() < end_time:
+                # Wake up in time to process debounced changes
+                timeout = self.debounce if self._pending else self.poll_interval
+                if end_time is not None:
+                    timeout = max(0.0, min(timeout, end_time - time.time()))
+                self.wait_for_changes(timeout)
+                self.process_pending()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+        report = self.latency_report()
+        if report["count"]:
+            print(f"Regenerations: {report['count']}, change to updated file latency: "
+                  f"mean {report['mean'] * 1000:.1f} ms, p95 {report['p95'] * 1000:.1f} ms, "
+                  f"max {report['max'] * 1000:.1f} ms")
+        return report
+
+
+def watch_scenes(file_pairs, debounce=0.2, poll_interval=0.5, use_inotify=None, duration=None,
+                 **conversion_options):
+    """Watch scene files and keep their outputs in sync, see SceneWatcher."""
+    watcher = SceneWatcher(file_pairs, debounce, poll_interval, use_inotify, **conversion_options)
+    return watcher.run(duration)
@@ -0,0 +1,143 @@
+import numpy as np
+
+"""
+transforms.py: Rotations and poses of the JSON scene descriptions.
+
+Author: Burak Aksoy
+
+JSON scenes give rotations in axis-angle form ("rotationAxis", "rotationAngle") and
+URDF gives them as transforms. The conversions between the two are shared by the
+converters (json_to_urdf.py, urdf_to_json.py) and the Scene arrays (scene.py):
+
+- R2rot: axis-angle of a single rotation matrix.
+- axis_angle_to_rotation_matrices / rotation_matrices_to_axis_angle: the same
+  conversions for many rotations at once.
+- pose_transform: 4 x 4 transform of a JSON style pose.
+"""
+
+
+def R2rot(R):
+    """
+    Recover k and theta from a 3 x 3 rotation matrix
+    
+        sin(theta) = | R-R^T |/2
+        cos(theta) = (tr(R)-1)/2
+        k = invhat(R-R^T)/(2*sin(theta))
+        theta = atan2(sin(theta),cos(theta)
+        
+    :type    R: numpy.array
+    :param   R: 3 x 3 rotation matrix    
+    :rtype:  (numpy.array, number)
+    :return: ( 3 x 1 k unit vector, rotation about k in radians)   
+    
+    """
+    def invhat(khat):
+        return np.array([(-khat[1,2] + khat[2,1]),(khat[0,2] - khat[2,0]),(-khat[0,1]+khat[1,0])])/2
+    
+    R1 = R-R.transpose()
+    
+    sin_theta = np.linalg.norm(R1)/np.sqrt(8)
+    
+    cos_theta = (np.trace(R) - 1.0)/2.0
+    theta = np.arctan2(sin_theta, cos_theta)
+    
+    #Avoid numerical singularity
+    if sin_theta < 1e-6:
+               
+        if (cos_theta > 0):
+            return [0,0,1], 0
+        else:
+            B = (1.0/2.0) *(R + np.eye(3))
+            k = np.sqrt([B[0,0], B[1,1], B[2,2]])
+            if np.abs(k[0]) > 1e-6:
+                k[1] = k[1] * np.sign(B[0,1] / k[0])
+                k[2] = k[2] * np.sign(B[0,2] / k[0])
+            elif np.abs(k[1]) > 1e-6:
+                k[2] = k[2] * np.sign(B[0,2] / k[1])
+            return list(np.squeeze(k)), np.pi
+    
+    k = invhat(R1)/(2.0*sin_theta)    
+    return list(np.squeeze(k)), theta
+
+
+def axis_angle_to_rotation_matrices(axes, angles):
+    """
+    Rotation matrices of many axis-angle rotations at once (Rodrigues' formula).
+
+    :type    axes: numpy.array
+    :param   axes: N x 3 unit rotation axes
+    :type    angles: numpy.array
+    :param   angles: N rotation angles in radians
+    :rtype:  numpy.array
+    :return: N x 3 x 3 rotation matrices
+    """
+    axes = np.asarray(axes, dtype=float).reshape(-1, 3)
+    angles = np.asarray(angles, dtype=float).reshape(-1)
+
+    khat = np.zeros((len(axes), 3, 3))
+    khat[:, 0, 1] = -axes[:, 2]
+    khat[:, 0, 2] = axes[:, 1]
+    khat[:, 1, 0] = axes[:, 2]
+    khat[:, 1, 2] = -axes[:, 0]
+    khat[:, 2, 0] = -axes[:, 1]
+    khat[:, 2, 1] = axes[:, 0]
+
+    sin = np.sin(angles)[:, np.newaxis, np.newaxis]
+    cos = np.cos(angles)[:, np.newaxis, np.newaxis]
+    return np.eye(3) + sin*khat + (1.0 - cos)*np.matmul(khat, khat)
+
+
+def rotation_matrices_to_axis_angle(R):
+    """
+    Axis-angle representation of many rotation matrices at once, vectorized R2rot.
+
+    :type    R: numpy.array
+    :param   R: N x 3 x 3 rotation matrices
+    :rtype:  (numpy.array, numpy.array)
+    :return: (N x 3 unit rotation axes, N rotation angles in radians)
+    """
+    R = np.asarray(R, dtype=float).reshape(-1, 3, 3)
+
+    R1 = R - np.transpose(R, (0, 2, 1))
+    sin_theta = np.linalg.norm(R1, axis=(1, 2))/np.sqrt(8)
+    cos_theta = (np.trace(R, axis1=1, axis2=2) - 1.0)/2.0
+    angles = np.arctan2(sin_theta, cos_theta)
+
+    # invhat(R1)/(2 sin(theta)), see R2rot
+    invhat = np.stack([(-R1[:, 1, 2] + R1[:, 2, 1]),
+                       (R1[:, 0, 2] - R1[:, 2, 0]),
+                       (-R1[:, 0, 1] + R1[:, 1, 0])], axis=1)/2
+    singular = sin_theta < 1e-6
+    with np.errstate(divide="ignore", invalid="ignore"):
+        axes = invhat/(2.0*sin_theta[:, np.newaxis])
+
+    # Rotations close to 0 or pi are rare, handled one by one like R2rot
+    for i in np.nonzero(singular)[0]:
+        axis, angle = R2rot(R[i])
+        axes[i] = axis
+        angles[i] = angle
+    return axes, angles
+
+
+def pose_transform(pose):
+    """
+    4 x 4 homogeneous transform of a pose.
+
+    :param   pose: 4 x 4 transform, JSON style pose dictionary ("rotationAxis", "rotationAngle"
+                   and "translation", missing fields are the identity) or None (identity)
+    :rtype:  numpy.array
+    :return: 4 x 4 transform
+    """
+    if pose is None:
+        return np.eye(4)
+    if isinstance(pose, dict):
+        transform = np.eye(4)
+        if "rotationAxis" in pose or "rotationAngle" in pose:
+            transform[:3, :3] = axis_angle_to_rotation_matrices(pose.get("rotationAxis", [0, 0, 1]),
+                                                                pose.get("rotationAngle", 0.0))[0]
+        transform[:3, 3] = pose.get("translation", [0.0, 0.0, 0.0])
+        return transform
+    transform = np.asarray(pose, dtype=float)
+    if transform.shape != (4, 4):
+        raise ValueError(f"Pose must be a 4x4 transform or a pose dictionary, got shape {transform.shape}")
+    return transform
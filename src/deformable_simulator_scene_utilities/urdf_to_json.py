@@ -4,8 +4,14 @@ import json
 
 import numpy as np
 
+from lxml import etree
+
 import yourdfpy
 
+from .geometry_paths import resolve_geometry_paths, resolve_geometry_path
+from .output_formats import dumps_json, parse_metadata_value
+from .transforms import R2rot, axis_angle_to_rotation_matrices
+
 """
 urdf_to_json.py: Transforms URDF files into JSON format for deformable object simulators.
 
@@ -19,8 +25,11 @@ Features and Process:
 - Calculates transformations (translations and rotations) relative to the root link, ensuring correct spatial relationships.
 - Handles multiple visual and collision geometries per link, including their origins.
 - Converts primitive geometries (box, cylinder, sphere) specified in URDF to corresponding mesh files located in a predefined 'primitives' directory.
-- Generates default values for necessary simulation parameters not typically included in URDF, such as dynamic properties and SDF resolutions.
+- Reads the simulator metadata embedded in the links by json_to_urdf (density, friction coefficients, SDF resolutions, ...) 
+  in the same parse as the rest of the URDF, so that JSON -> URDF -> JSON is an exact round trip.
+- Generates default values for necessary simulation parameters not included in the URDF, such as dynamic properties and SDF resolutions.
 - Outputs a well-formatted JSON file with comprehensive scene description, including custom metadata fields for enhanced simulation fidelity.
+  Compact and canonical output profiles are available as well (see output_formats.py).
 
 Usage:
 The script requires the path to the URDF file and optionally outputs the resultant JSON to a specified file. 
@@ -37,8 +46,15 @@ Invoke the urdf_to_json function with appropriate parameters to convert an URDF
 Design Considerations:
 - The script identifies the root link by detecting which link is not a child in any joint definition.
 - It correctly handles scenarios with multiple disconnected trees of links, ensuring that each tree's root transformations are computed accurately.
-- The script ignores non-visual links, non-fixed joints, and other URDF elements like inertials, transmissions, 
+- The script ignores non-visual links, non-fixed joints, and other URDF elements like transmissions 
 and materials that are irrelevant to the JSON format needed for simulators.
+- The inertial of a link with a single visual is converted to the "mass", "centerOfMass" and "inertia" 
+fields of its body, in the frame of the visual.
+- Embedded ids, geometry files and axis-angle rotations are only used for links with a single visual, 
+and only if they still agree with the URDF geometry and pose, so hand edits of the URDF take precedence.
+- With preserve_hierarchy=True, links without visuals below the root are kept as groups ("RigidBodyGroups",
+with their pose relative to the parent group) and each body records its closest group in a "group" field.
+Body poses are always relative to the root.
 
 Note: This script is part of a toolchain that facilitates the integration of robotic planning and simulation environments
 by enabling seamless transitions between URDF and custom JSON formats used in specific simulators.
@@ -50,50 +66,153 @@ current_file_dir = os.path.dirname(os.path.abspath(__file__))
 # Path to the primitives directory
 primitives_dir = os.path.join(current_file_dir, 'meshes', 'primitives')
 
-def R2rot(R):
+# Children of a URDF link that are parsed by yourdfpy,
+# every other child element is simulator metadata embedded by json_to_urdf
+_URDF_LINK_ELEMENTS = ("inertial", "visual", "collision")
+
+# Body fields derived from the URDF elements, embedded copies of them are
+# either validated against the URDF (id, geometry file, rotation) or ignored
+_GEOMETRIC_FIELDS = ("id", "rotationAxis", "rotationAngle", "translation",
+                     "geometryFile", "scale", "collisionObjectScale")
+
+# Body fields derived from the URDF inertial elements (see mass_properties.py)
+_INERTIAL_FIELDS = ("mass", "centerOfMass", "inertia")
+
+# Fields describing the scene hierarchy, derived from the URDF tree when the hierarchy is preserved
+_HIERARCHY_FIELDS = ("group", "parent")
+
+# Embedded rotations are used if they agree with the URDF pose within this tolerance
+_ROTATION_TOLERANCE = 1e-6
+
+def _load_urdf(fname_or_file, load_meshes=False, package_index=None, path_rewrite_rules=None):
     """
-    Recover k and theta from a 3 x 3 rotation matrix
-    
-        sin(theta) = | R-R^T |/2
-        cos(theta) = (tr(R)-1)/2
-        k = invhat(R-R^T)/(2*sin(theta))
-        theta = atan2(sin(theta),cos(theta)
-        
-    :type    R: numpy.array
-    :param   R: 3 x 3 rotation matrix    
-    :rtype:  (numpy.array, number)
-    :return: ( 3 x 1 k unit vector, rotation about k in radians)   
-    
+    Parse a URDF once into a yourdfpy model and the metadata elements of its links.
+
+    The transforms only need the scene graph, so meshes are only loaded on request
+    (e.g. for visualization). Their file names are then resolved through the
+    geometry path cache instead of yourdfpy.filename_handler_magic.
+
+    :rtype:  (yourdfpy.URDF, dict)
+    :return: (URDF model, link name -> {metadata field: typed value})
     """
-    def invhat(khat):
-        return np.array([(-khat[1,2] + khat[2,1]),(khat[0,2] - khat[2,0]),(-khat[0,1]+khat[1,0])])/2
-    
-    R1 = R-R.transpose()
-    
-    sin_theta = np.linalg.norm(R1)/np.sqrt(8)
-    
-    cos_theta = (np.trace(R) - 1.0)/2.0
-    theta = np.arctan2(sin_theta, cos_theta)
-    
-    #Avoid numerical singularity
-    if sin_theta < 1e-6:
-               
-        if (cos_theta > 0):
-            return [0,0,1], 0
-        else:
-            B = (1.0/2.0) *(R + np.eye(3))
-            k = np.sqrt([B[0,0], B[1,1], B[2,2]])
-            if np.abs(k[0]) > 1e-6:
-                k[1] = k[1] * np.sign(B[0,1] / k[0])
-                k[2] = k[2] * np.sign(B[0,2] / k[0])
-            elif np.abs(k[1]) > 1e-6:
-                k[2] = k[2] * np.sign(B[0,2] / k[1])
-            return list(np.squeeze(k)), np.pi
-    
-    k = invhat(R1)/(2.0*sin_theta)    
-    return list(np.squeeze(k)), theta
-    
-def _urdf_to_json(urdf_model, primitives_dir="./", visualize=False):
+    kwargs = {"load_meshes": load_meshes}
+    if isinstance(fname_or_file, str):
+        # Same default as yourdfpy.URDF.load
+        kwargs["mesh_dir"] = os.path.dirname(fname_or_file)
+    if load_meshes:
+        mesh_dir = kwargs.get("mesh_dir") or "/"
+        resolution_cache = {}
+        kwargs["filename_handler"] = lambda fname: resolve_geometry_path(fname, mesh_dir,
+                                                                         package_index=package_index,
+                                                                         rewrite_rules=path_rewrite_rules,
+                                                                         cache=resolution_cache)
+
+    parser = etree.XMLParser(remove_blank_text=True)
+    xml_root = etree.parse(fname_or_file, parser=parser).getroot()
+    etree.strip_tags(xml_root, etree.Comment)
+    etree.cleanup_namespaces(xml_root)
+
+    # Collect the custom elements in the same pass over the links
+    link_metadata = {}
+    for link_element in xml_root.findall("link"):
+        metadata = {child.tag: parse_metadata_value(child.text)
+                    for child in link_element
+                    if isinstance(child.tag, str) and child.tag not in _URDF_LINK_ELEMENTS}
+        if metadata:
+            link_metadata[link_element.attrib["name"]] = metadata
+
+    if hasattr(yourdfpy.URDF, "_parse_robot"):
+        # The parsed tree is reused, as in yourdfpy.URDF.load (yourdfpy <= 0.0.60)
+        urdf_model = yourdfpy.URDF(robot=yourdfpy.URDF._parse_robot(xml_element=xml_root), **kwargs)
+    else:
+        # Other yourdfpy versions parse the tree again
+        urdf_model = yourdfpy.URDF.load(io.BytesIO(etree.tostring(xml_root)), **kwargs)
+    return urdf_model, link_metadata
+
+def _geometry_scale(geometry):
+    # Scale of the primitive meshes, or the mesh scale
+    if geometry.box:
+        return list(map(float, geometry.box.size))
+    if geometry.cylinder:
+        radius = float(geometry.cylinder.radius)
+        length = float(geometry.cylinder.length)
+        return [radius, radius, length]
+    if geometry.sphere:
+        radius = float(geometry.sphere.radius)
+        return [radius, radius, radius]
+    if geometry.mesh:
+        if geometry.mesh.scale is None:
+            return [1, 1, 1]
+        return list(geometry.mesh.scale)
+    return None
+
+def _embedded_geometry_file_matches(embedded_file, visual, resolved_file):
+    # The embedded geometry file is only used if it still describes the URDF geometry
+    if not isinstance(embedded_file, str):
+        return False
+    if visual.geometry.box:
+        return "primitives/box.obj" in embedded_file
+    if visual.geometry.mesh:
+        return visual.geometry.mesh.filename in (embedded_file, f"file://{embedded_file}") \
+            or resolved_file == embedded_file
+    return False
+
+def _visual_geometry_file(visual, primitives_dir):
+    # Unresolved geometry file name of a visual, primitives are mapped to meshes
+    if visual.geometry.box:
+        return f"{primitives_dir}/box.obj"
+    if visual.geometry.cylinder:
+        return f"{primitives_dir}/cylinder.obj"
+    if visual.geometry.sphere:
+        return f"{primitives_dir}/sphere.obj"
+    if visual.geometry.mesh:
+        return visual.geometry.mesh.filename
+    return None
+
+def _parent_group(link_name, parent_links, group_links):
+    # Closest group link above a link, None if the link is directly below the root
+    parent = parent_links.get(link_name)
+    while parent is not None and parent not in group_links:
+        parent = parent_links.get(parent)
+    return parent
+
+def _rotation_axis_angle(rotation_matrix, metadata, link_name):
+    # Axis-angle of a rotation, the exact embedded axis-angle is preferred over the one recovered from rpy
+    rotation_axis, rotation_angle = R2rot(rotation_matrix)
+    rotation_angle = float(rotation_angle)
+    if "rotationAxis" in metadata and "rotationAngle" in metadata:
+        try:
+            embedded_rotation = axis_angle_to_rotation_matrices(metadata["rotationAxis"],
+                                                                metadata["rotationAngle"])[0]
+            if np.allclose(embedded_rotation, rotation_matrix, rtol=0.0, atol=_ROTATION_TOLERANCE):
+                rotation_axis = metadata["rotationAxis"]
+                rotation_angle = metadata["rotationAngle"]
+        except (TypeError, ValueError, IndexError):
+            print("Ignoring invalid embedded rotation of link: ", link_name)
+    return rotation_axis, rotation_angle
+
+def _inertial_fields(inertial, transform_link_to_visual):
+    # Mass, center of mass and inertia components of a link inertial, in the frame of the visual
+    if inertial is None or inertial.mass is None:
+        return {}
+    transform_visual_to_inertial = np.dot(np.linalg.inv(transform_link_to_visual),
+                                          np.eye(4) if inertial.origin is None else np.array(inertial.origin))
+    inertia = np.zeros((3, 3)) if inertial.inertia is None else np.array(inertial.inertia, dtype=float)
+
+    # Rotate the inertia tensor only if needed, to keep the written values exact
+    rotation = transform_visual_to_inertial[:3, :3]
+    if not np.array_equal(rotation, np.eye(3)):
+        inertia = np.dot(np.dot(rotation, inertia), rotation.T)
+
+    return {"mass": float(inertial.mass),
+            "centerOfMass": [float(value) for value in transform_visual_to_inertial[:3, 3]],
+            "inertia": [float(inertia[0, 0]), float(inertia[0, 1]), float(inertia[0, 2]),
+                        float(inertia[1, 1]), float(inertia[1, 2]), float(inertia[2, 2])]}
+
+def _urdf_to_json(urdf_model, primitives_dir="./", visualize=False,
+                  package_index=None, path_rewrite_rules=None,
+                  output_profile="pretty", significant_digits=None,
+                  link_metadata=None, preserve_hierarchy=False):
     # Validate the URDF model
     if urdf_model.validate():
         print("URDF model is valid")
@@ -108,10 +227,33 @@ def _urdf_to_json(urdf_model, primitives_dir="./", visualize=False):
     json_data = {}
     json_data["Name"] = urdf_model.base_link
 
-    # We will create a list of rigid bodies from the visuals in the urdf
-    # with increasing id numbers
+    if link_metadata is None:
+        link_metadata = {}
+
+    # We will create a list of rigid bodies from the visuals in the urdf.
+    # Bodies keep the ids embedded in their links, the others get increasing
+    # id numbers once all embedded ids are known
     rigid_bodies = []
-    id = 1
+    used_ids = set()
+
+    # Links without visuals below the root are the groups of the links below them
+    parent_links = {}
+    group_links = set()
+    rigid_body_groups = {}
+    if preserve_hierarchy:
+        parent_links = {joint.child: joint.parent for joint in urdf_model.robot.joints}
+        group_links = {link_name for link_name, link_obj in urdf_model.link_map.items()
+                       if not link_obj.visuals and link_name != urdf_model.base_link}
+
+    # Resolve all geometry files of the scene in one batch,
+    # repeated files (e.g. primitives) are only resolved once
+    geometry_files = [_visual_geometry_file(visual, primitives_dir)
+                      for link_obj in urdf_model.link_map.values()
+                      for visual in link_obj.visuals]
+    resolved_geometry_files = resolve_geometry_paths([f for f in geometry_files if f is not None], "/",
+                                                     package_index=package_index,
+                                                     rewrite_rules=path_rewrite_rules,
+                                                     cache={})
 
     for link_name, link_obj in urdf_model.link_map.items():
         # print("link_name: ", link_name)
@@ -122,76 +264,81 @@ def _urdf_to_json(urdf_model, primitives_dir="./", visualize=False):
                                                         frame_from=urdf_model.base_link, 
                                                         collision_geometry=False) # 4x4 list
         transform_base_link_to_link = np.array(transform_base_link_to_link) # 4x4 numpy array
+
+        parent_group = _parent_group(link_name, parent_links, group_links)
+        if link_name in group_links:
+            # Group pose relative to its parent group, or the root
+            transform_parent_to_link = transform_base_link_to_link
+            if parent_group is not None:
+                transform_base_link_to_parent = np.array(urdf_model.get_transform(frame_to=parent_group,
+                                                                                  frame_from=urdf_model.base_link,
+                                                                                  collision_geometry=False))
+                transform_parent_to_link = np.dot(np.linalg.inv(transform_base_link_to_parent),
+                                                  transform_base_link_to_link)
+
+            group_dict = {}
+            if parent_group is not None:
+                group_dict["parent"] = parent_group
+            group_dict["translation"] = list(transform_parent_to_link[:3, 3])
+            group_metadata = link_metadata.get(link_name, {})
+            group_dict["rotationAxis"], group_dict["rotationAngle"] = _rotation_axis_angle(transform_parent_to_link[:3, :3],
+                                                                                          group_metadata, link_name)
+            for key, value in group_metadata.items():
+                if key not in _GEOMETRIC_FIELDS and key not in _HIERARCHY_FIELDS:
+                    group_dict[key] = value
+            rigid_body_groups[link_name] = group_dict
+
+        # Metadata embedded in the link, body specific fields (id, geometry file and rotation)
+        # are only unambiguous for links with a single visual
+        metadata = link_metadata.get(link_name, {})
+        single_visual = len(link_obj.visuals) == 1
+
+        # Collision geometries are matched to the visuals by their order
+        if len(link_obj.collisions) == len(link_obj.visuals):
+            collision_geometries = [collision.geometry for collision in link_obj.collisions]
+        else:
+            collision_geometries = [None] * len(link_obj.visuals)
         
         if link_obj.visuals:
-            for visual in link_obj.visuals:
+            for visual, collision_geometry in zip(link_obj.visuals, collision_geometries):
                 rb_dict = {}
-                rb_dict["id"] = id
+                rb_dict["id"] = None
+                if single_visual and isinstance(metadata.get("id"), int) and metadata["id"] not in used_ids:
+                    rb_dict["id"] = metadata["id"]
+                    used_ids.add(rb_dict["id"])
                 
                 # Find the transform from the base_link to the visual origin
                 if visual.origin is not None:
                     transform_link_to_visual = np.array(visual.origin)
                     transform_base_link_to_visual = np.dot(transform_base_link_to_link, transform_link_to_visual)
                 else:
+                    transform_link_to_visual = np.eye(4)
                     transform_base_link_to_visual = transform_base_link_to_link
                 
                 # print("link visual transform to base_link: ", transform_base_link_to_visual)
                 
-                rotation_axis, rotation_angle = R2rot(transform_base_link_to_visual[:3, :3])
+                rotation_axis, rotation_angle = _rotation_axis_angle(transform_base_link_to_visual[:3, :3],
+                                                                     metadata if single_visual else {}, link_name)
+
                 rb_dict["rotationAxis"] = rotation_axis
-                rb_dict["rotationAngle"] = float(rotation_angle)
+                rb_dict["rotationAngle"] = rotation_angle
                 rb_dict["translation"] = list(transform_base_link_to_visual[:3, 3])
                 
                 # Find the Geometry file
-                if visual.geometry.box:
-                    geometry_file = f"{primitives_dir}/box.obj"
-                    
-                    # prints if the path is not resolved
-                    geometry_file = yourdfpy.filename_handler_magic(geometry_file, "/") # 
-                    rb_dict["geometryFile"] = geometry_file
-                    
-                    rb_dict["scale"] = list(map(float, visual.geometry.box.size))
-                    rb_dict["collisionObjectScale"] = rb_dict["scale"]
-                    
-                if visual.geometry.cylinder:
-                    geometry_file = f"{primitives_dir}/cylinder.obj"
-                    
-                    # prints if the path is not resolved
-                    geometry_file = yourdfpy.filename_handler_magic(geometry_file, "/") # 
-                    rb_dict["geometryFile"] = geometry_file
-                    
-                    radius = float(visual.geometry.cylinder.radius)
-                    length = float(visual.geometry.cylinder.length)
-                    rb_dict["scale"] = [radius, radius, length]
-                    rb_dict["collisionObjectScale"] = rb_dict["scale"]
-                    
-                if visual.geometry.sphere:
-                    geometry_file = f"{primitives_dir}/sphere.obj"
-                    
-                    # prints if the path is not resolved
-                    geometry_file = yourdfpy.filename_handler_magic(geometry_file, "/") # 
+                geometry_file = _visual_geometry_file(visual, primitives_dir)
+                if geometry_file is not None:
+                    geometry_file = resolved_geometry_files[geometry_file]
+                    if single_visual and _embedded_geometry_file_matches(metadata.get("geometryFile"), visual, geometry_file):
+                        geometry_file = metadata["geometryFile"]
                     rb_dict["geometryFile"] = geometry_file
-                    
-                    radius = float(visual.geometry.sphere.radius)
-                    rb_dict["scale"] = [radius, radius, radius]
-                    rb_dict["collisionObjectScale"] = rb_dict["scale"]
-                    
-                if visual.geometry.mesh:
-                    geometry_file = visual.geometry.mesh.filename
-                    
-                    # prints if the path is not resolved
-                    geometry_file = yourdfpy.filename_handler_magic(geometry_file, "/") 
-                    rb_dict["geometryFile"] = geometry_file
-                    
-                    
-                    if visual.geometry.mesh.scale is None:
-                        rb_dict["scale"] = [1, 1, 1]
+
+                    rb_dict["scale"] = _geometry_scale(visual.geometry)
+                    if collision_geometry is not None and _geometry_scale(collision_geometry) is not None:
+                        rb_dict["collisionObjectScale"] = _geometry_scale(collision_geometry)
                     else:
-                        rb_dict["scale"] = list(visual.geometry.mesh.scale)
-                        
-                    rb_dict["collisionObjectScale"] = rb_dict["scale"]
+                        rb_dict["collisionObjectScale"] = rb_dict["scale"]
                 
-                # Fill the rest of the metadata with the default values
+                # Fill the rest of the metadata with the embedded or the default values
                 rb_dict["isDynamic"] = 0
                 rb_dict["density"] = 1.0
                 rb_dict["velocity"] = [0.0, 0.0, 0.0]
@@ -203,38 +350,66 @@ def _urdf_to_json(urdf_model, primitives_dir="./", visualize=False):
                 rb_dict["collisionObjectFileName"] = ""
                 rb_dict["resolutionSDF"] = [50, 50, 50]
                 rb_dict["invertSDF"] = 0
-                
+
+                # The group comes from the URDF tree, the embedded one only keeps its position
+                for key, value in metadata.items():
+                    if key == "group" and parent_group is not None:
+                        rb_dict[key] = parent_group
+                    elif key not in _GEOMETRIC_FIELDS and key not in _HIERARCHY_FIELDS and key not in _INERTIAL_FIELDS:
+                        rb_dict[key] = value
+                if parent_group is not None:
+                    rb_dict["group"] = parent_group
+
+                # A link has a single inertial, it is only unambiguous for links with a single visual
+                if single_visual:
+                    rb_dict.update(_inertial_fields(link_obj.inertial, transform_link_to_visual))
 
                 rigid_bodies.append(rb_dict)
-                id += 1
         else:
             # print("---- No visuals in link ----")
             pass
                 
         # print("---------------------------------")
+
+    # Increasing id numbers for the bodies without an embedded id
+    id = 1
+    for rb_dict in rigid_bodies:
+        if rb_dict["id"] is None:
+            while id in used_ids:
+                id += 1
+            rb_dict["id"] = id
+            used_ids.add(id)
         
     json_data["RigidBodies"] = rigid_bodies
+    if rigid_body_groups:
+        json_data["RigidBodyGroups"] = rigid_body_groups
 
     # print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
     # print("Created json_data: ")
 
-    json_str = json.dumps(json_data, indent=4)
+    json_str = dumps_json(json_data, output_profile, significant_digits)
     # print(json_str)
     
     return json_str
 
 def urdf_to_json(input_file_path, 
                  save_output=False, output_file_path=None, 
-                 visualize=False):
+                 visualize=False,
+                 package_index=None, path_rewrite_rules=None,
+                 output_profile="pretty", significant_digits=None,
+                 preserve_hierarchy=False):
     
     # Check if the input file exists
     if not os.path.exists(input_file_path):
         print("Input file does not exist.")
         return None
     
-    urdf_model = yourdfpy.URDF.load(input_file_path)
+    urdf_model, link_metadata = _load_urdf(input_file_path, visualize, package_index, path_rewrite_rules)
     
-    json_str = _urdf_to_json(urdf_model, primitives_dir, visualize)
+    json_str = _urdf_to_json(urdf_model, primitives_dir, visualize,
+                             package_index, path_rewrite_rules,
+                             output_profile, significant_digits,
+                             link_metadata, preserve_hierarchy)
     
     if save_output:
         if not (output_file_path == "" or output_file_path is None):
@@ -252,11 +427,17 @@ def urdf_to_json(input_file_path,
     
 def urdf_str_to_json(urdf_str, 
                      save_output=False, output_file_path=None, 
-                     visualize=False):
-    file_obj =  io.StringIO(urdf_str)
-    urdf_model = yourdfpy.URDF.load(file_obj)
+                     visualize=False,
+                     package_index=None, path_rewrite_rules=None,
+                     output_profile="pretty", significant_digits=None,
+                     preserve_hierarchy=False):
+    file_obj =  io.BytesIO(urdf_str.encode("utf-8"))
+    urdf_model, link_metadata = _load_urdf(file_obj, visualize, package_index, path_rewrite_rules)
     
-    json_str = _urdf_to_json(urdf_model, primitives_dir, visualize)
+    json_str = _urdf_to_json(urdf_model, primitives_dir, visualize,
+                             package_index, path_rewrite_rules,
+                             output_profile, significant_digits,
+                             link_metadata, preserve_hierarchy)
     
     if save_output:
         if not (output_file_path == "" or output_file_path is None):
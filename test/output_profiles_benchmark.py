@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+
+from xml.etree import ElementTree
+
+# This line inserts the package directory at the start of the system path
+# Assuming your test scripts are being run from the `test` directory
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import Scene
+from deformable_simulator_scene_utilities.output_formats import OUTPUT_PROFILES
+
+num_bodies = 5000
+num_repeats = 3
+
+# Build a large scene by repeating the bodies of the example scene with random poses
+example_scene = Scene.from_json_file(os.path.join("./", "example.json"))
+rng = np.random.default_rng(0)
+indices = np.arange(num_bodies) % len(example_scene)
+
+bodies = []
+for i, index in enumerate(indices):
+    body = dict(example_scene.bodies[index])
+    body["id"] = i + 1
+    bodies.append(body)
+
+rotation_axes = rng.normal(size=(num_bodies, 3))
+rotation_axes /= np.linalg.norm(rotation_axes, axis=1, keepdims=True)
+
+scene = Scene(example_scene.name, bodies,
+              translations=rng.uniform(-10.0, 10.0, size=(num_bodies, 3)),
+              rotation_axes=rotation_axes,
+              rotation_angles=rng.uniform(0.0, np.pi, size=num_bodies),
+              scales=example_scene.scales[indices],
+              collision_scales=example_scene.collision_scales[indices])
+
+def best_time(fn):
+    times = []
+    for _ in range(num_repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+print(f"Scene with {num_bodies} bodies, best of {num_repeats} runs")
+print(f"{'format':<8}{'profile':<11}{'size [kB]':>12}{'serialize [ms]':>16}{'parse [ms]':>12}")
+
+for output_profile in OUTPUT_PROFILES:
+    serialize_time, json_str = best_time(lambda: scene.to_json_str(output_profile))
+    parse_time, _ = best_time(lambda: json.loads(json_str))
+    print(f"{'JSON':<8}{output_profile:<11}{len(json_str) / 1000:>12.1f}"
+          f"{serialize_time * 1000:>16.1f}{parse_time * 1000:>12.1f}")
+
+for output_profile in OUTPUT_PROFILES:
+    serialize_time, urdf_str = best_time(lambda: scene.to_urdf_str(output_profile))
+    parse_time, _ = best_time(lambda: ElementTree.fromstring(urdf_str.encode("utf-8")))
+    print(f"{'URDF':<8}{output_profile:<11}{len(urdf_str) / 1000:>12.1f}"
+          f"{serialize_time * 1000:>16.1f}{parse_time * 1000:>12.1f}")
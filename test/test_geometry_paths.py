@@ -0,0 +1,93 @@
+import os
+import sys
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import (resolve_geometry_paths, resolve_geometry_path,
+                                                  build_package_index, clear_geometry_path_cache)
+from deformable_simulator_scene_utilities import geometry_paths
+
+PRIMITIVES_DIR = os.path.join(package_path, "deformable_simulator_scene_utilities", "meshes", "primitives")
+
+
+def make_package(root, package_name, dir_name):
+    package_dir = root / dir_name
+    (package_dir / "meshes").mkdir(parents=True)
+    (package_dir / "package.xml").write_text(f"<package><name>{package_name}</name></package>")
+    (package_dir / "meshes" / "table.obj").write_text("v 0 0 0\n")
+    return package_dir
+
+
+def test_rewrite_rules():
+    clear_geometry_path_cache()
+    fname = "/home/burak/catkin_ws/src/deformable_simulator_scene_utilities/meshes/primitives/box.obj"
+    rules = [("/home/burak/catkin_ws/src/deformable_simulator_scene_utilities/meshes/primitives", PRIMITIVES_DIR)]
+    assert resolve_geometry_path(fname, rewrite_rules=rules) == os.path.join(PRIMITIVES_DIR, "box.obj")
+
+
+def test_package_uris_use_the_package_index(tmp_path):
+    clear_geometry_path_cache()
+    # The package name comes from package.xml, not from the directory name
+    package_dir = make_package(tmp_path, "scene_meshes", "scene_meshes_checkout")
+    package_index = build_package_index([str(tmp_path)])
+    assert package_index == {"scene_meshes": str(package_dir)}
+
+    resolved = resolve_geometry_paths(["package://scene_meshes/meshes/table.obj"], package_index=package_index)
+    assert resolved == {"package://scene_meshes/meshes/table.obj": str(package_dir / "meshes" / "table.obj")}
+
+
+def test_cache_hits(tmp_path, monkeypatch):
+    clear_geometry_path_cache()
+    package_dir = make_package(tmp_path, "scene_meshes", "scene_meshes")
+    fnames = [str(package_dir / "meshes" / "table.obj")] * 50 + [os.path.join(PRIMITIVES_DIR, "box.obj")]
+
+    listed_paths = []
+    existing_files = geometry_paths._existing_files
+    monkeypatch.setattr(geometry_paths, "_existing_files",
+                        lambda paths: listed_paths.append(set(paths)) or existing_files(paths))
+
+    cache = {}
+    first = resolve_geometry_paths(fnames, cache=cache)
+    assert len(listed_paths) == 1
+    assert len(cache) == 2
+
+    # Later conversions are served by the per-conversion and the process-wide caches
+    assert resolve_geometry_paths(fnames, cache=cache) == first
+    assert resolve_geometry_paths(fnames) == first
+    assert len(listed_paths) == 1
+
+    # Without the process-wide cache the files are checked again
+    assert resolve_geometry_paths(fnames, use_process_cache=False) == first
+    assert len(listed_paths) == 2
+
+
+def test_unresolved_paths_fall_back_to_the_rewritten_name(tmp_path):
+    clear_geometry_path_cache()
+    fname = "/old/machine/meshes/table.obj"
+    rules = [("/old/machine", str(tmp_path))]
+    assert resolve_geometry_path(fname, rewrite_rules=rules) == str(tmp_path / "meshes" / "table.obj")
+    assert len(geometry_paths._resolved_path_cache) == 0
+
+    # Unresolved paths are not cached process-wide, the file can appear later
+    make_package(tmp_path, "scene_meshes", ".")
+    assert resolve_geometry_path(fname, rewrite_rules=rules) == str(tmp_path / "meshes" / "table.obj")
+    assert len(geometry_paths._resolved_path_cache) == 1
+
+
+def test_only_listed_candidates_are_checked(tmp_path, monkeypatch):
+    (tmp_path / "meshes").mkdir()
+    (tmp_path / "meshes" / "table.obj").write_text("v 0 0 0\n")
+    for i in range(100):
+        (tmp_path / "meshes" / f"other_{i}.obj").write_text("")
+    candidates = [str(tmp_path / "meshes" / "table.obj"), str(tmp_path / "meshes" / "chair.obj"),
+                  str(tmp_path / "meshes")]
+
+    checked_paths = []
+    isfile = os.path.isfile
+    monkeypatch.setattr(os.path, "isfile", lambda path: checked_paths.append(path) or isfile(path))
+
+    # Directories with a candidate name are not files
+    assert geometry_paths._existing_files(candidates) == {candidates[0]}
+    assert sorted(checked_paths) == sorted([candidates[0], candidates[2]])
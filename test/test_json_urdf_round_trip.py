@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import json_str_to_urdf, urdf_str_to_json
+
+# Geometry files of the random bodies, the mesh files do not need to exist
+GEOMETRY_FILES = [
+    "/home/user/ws/src/deformable_simulator_scene_utilities/meshes/primitives/box.obj",
+    "/home/user/ws/src/deformable_simulator_scene_utilities/meshes/primitives/cylinder.obj",
+    "/home/user/ws/src/deformable_simulator_scene_utilities/meshes/primitives/sphere.obj",
+    "/home/user/ws/src/scene_meshes/table.obj",
+    "/home/user/ws/src/scene_meshes/fixture.stl",
+]
+
+
+def random_scene(rng, num_bodies):
+    """Random scene with every JSON field set to a random value of its type."""
+    ids = rng.permutation(np.arange(1, 10 * num_bodies))[:num_bodies]
+    rigid_bodies = []
+    for i in range(num_bodies):
+        axis = rng.normal(size=3)
+        axis /= np.linalg.norm(axis)
+        collision_scale = rng.uniform(0.01, 5.0, size=3)
+        rigid_bodies.append({
+            "id": int(ids[i]),
+            "rotationAxis": axis.tolist(),
+            "rotationAngle": float(rng.uniform(0.0, np.pi)),
+            "translation": rng.uniform(-10.0, 10.0, size=3).tolist(),
+            "geometryFile": GEOMETRY_FILES[rng.integers(len(GEOMETRY_FILES))],
+            "scale": (collision_scale * rng.uniform(0.5, 1.5, size=3)).tolist(),
+            "collisionObjectScale": collision_scale.tolist(),
+            "isDynamic": int(rng.integers(2)),
+            "density": float(rng.uniform(0.1, 10000.0)),
+            "velocity": rng.normal(size=3).tolist(),
+            "angularVelocity": rng.normal(size=3).tolist(),
+            "restitution": float(rng.uniform()),
+            "frictionStatic": float(rng.uniform()),
+            "frictionDynamic": float(rng.uniform()),
+            "comment": [f"random body {i}, with punctuation: <&>\"'", "42", "-1.5e3", "null", "true", "True",
+                        "[1, 2]", "{}"][rng.integers(8)],
+            "collisionObjectFileName": ["", f"/tmp/sdf/body_{i}.cdf"][rng.integers(2)],
+            "resolutionSDF": rng.integers(10, 100, size=3).tolist(),
+            "invertSDF": int(rng.integers(2)),
+        })
+    return {"Name": "random_scene_base_link", "RigidBodies": rigid_bodies}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_json_urdf_json_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    json_data = random_scene(rng, num_bodies=200)
+
+    urdf_str = json_str_to_urdf(json.dumps(json_data))
+    round_trip_data = json.loads(urdf_str_to_json(urdf_str))
+
+    assert round_trip_data == json_data
+
+
+def test_edited_urdf_pose_takes_precedence():
+    rng = np.random.default_rng(0)
+    json_data = random_scene(rng, num_bodies=1)
+    json_data["RigidBodies"][0]["geometryFile"] = GEOMETRY_FILES[0]
+
+    # Rotate the body in the URDF only, the embedded rotation is then stale
+    urdf_str = json_str_to_urdf(json.dumps(json_data))
+    origin_start = urdf_str.index('rpy="') + len('rpy="')
+    origin_end = urdf_str.index('"', origin_start)
+    urdf_str = urdf_str[:origin_start] + "0.0 0.0 0.5" + urdf_str[origin_end:]
+
+    body = json.loads(urdf_str_to_json(urdf_str))["RigidBodies"][0]
+    assert body["rotationAxis"] == pytest.approx([0.0, 0.0, 1.0])
+    assert body["rotationAngle"] == pytest.approx(0.5)
+    assert body["density"] == json_data["RigidBodies"][0]["density"]
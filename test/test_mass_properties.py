@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import (compute_mass_properties, add_mass_properties,
+                                                  clear_mesh_cache, json_str_to_urdf, urdf_str_to_json)
+from deformable_simulator_scene_utilities import mass_properties
+from deformable_simulator_scene_utilities.json_to_urdf import _json_data_to_urdf
+
+PRIMITIVES_DIR = os.path.join(package_path, "deformable_simulator_scene_utilities", "meshes", "primitives")
+
+
+def body(geometry_file, scale, density=1000.0, is_dynamic=1):
+    return {"id": 1, "rotationAxis": [0.0, 0.0, 1.0], "rotationAngle": 0.0, "translation": [0.0, 0.0, 0.0],
+            "geometryFile": geometry_file, "scale": scale, "collisionObjectScale": scale, "density": density,
+            "isDynamic": is_dynamic}
+
+
+def test_box_closed_form():
+    volumes, masses, centers_of_mass, inertias = compute_mass_properties(
+        [body("/any/dir/primitives/box.obj", [2.0, 3.0, 4.0])])
+    assert volumes[0] == pytest.approx(24.0)
+    assert masses[0] == pytest.approx(24000.0)
+    np.testing.assert_array_equal(centers_of_mass[0], [0.0, 0.0, 0.0])
+    np.testing.assert_allclose(inertias[0], np.diag([9.0 + 16.0, 4.0 + 16.0, 4.0 + 9.0]) * 24000.0 / 12.0)
+
+
+@pytest.mark.parametrize("primitive, tolerance", [("box", 1e-12), ("cylinder", 5e-2), ("sphere", 5e-2)])
+def test_meshes_match_closed_forms(tmp_path, primitive, tolerance):
+    # A copy of the primitive mesh is integrated as a mesh, off center to test the center of mass
+    vertices, triangles = mass_properties.load_obj(os.path.join(PRIMITIVES_DIR, f"{primitive}.obj"))
+    mesh_path = str(tmp_path / f"{primitive}_mesh.obj")
+    with open(mesh_path, "w") as file:
+        file.writelines(f"v {x + 1.0} {y - 2.0} {z}\n" for x, y, z in vertices)
+        file.writelines(f"f {a + 1} {b + 1} {c + 1}\n" for a, b, c in triangles)
+
+    scale = [0.5, 1.5, 2.0]
+    primitive_properties = compute_mass_properties([body(f"/primitives/{primitive}.obj", scale)])
+    mesh_properties = compute_mass_properties([body(mesh_path, scale)])
+
+    np.testing.assert_allclose(mesh_properties[0], primitive_properties[0], rtol=tolerance)
+    np.testing.assert_allclose(mesh_properties[2][0], [0.5, -3.0, 0.0], atol=1e-6)
+    np.testing.assert_allclose(mesh_properties[3], primitive_properties[3], rtol=tolerance,
+                               atol=tolerance * np.abs(primitive_properties[3]).max())
+
+
+def test_mesh_integrals_are_cached(tmp_path):
+    clear_mesh_cache()
+    mesh_path = str(tmp_path / "table.obj")
+    shutil.copy(os.path.join(PRIMITIVES_DIR, "box.obj"), mesh_path)
+
+    bodies = [body(mesh_path, [1.0 + i, 1.0, 1.0]) for i in range(100)]
+    volumes = compute_mass_properties(bodies)[0]
+    np.testing.assert_allclose(volumes, np.arange(1, 101))
+    assert list(mass_properties._mesh_integral_cache) == [mesh_path]
+
+
+def test_unreadable_meshes_are_skipped():
+    json_data = {"Name": "scene", "RigidBodies": [body("/does/not/exist.obj", [1.0, 1.0, 1.0])]}
+    assert add_mass_properties(json_data) == json_data
+
+
+def test_static_bodies_are_skipped(tmp_path):
+    clear_mesh_cache()
+    mesh_path = str(tmp_path / "table.obj")
+    shutil.copy(os.path.join(PRIMITIVES_DIR, "box.obj"), mesh_path)
+
+    volumes = compute_mass_properties([body("/primitives/box.obj", [1.0, 1.0, 1.0], is_dynamic=0),
+                                       body(mesh_path, [1.0, 1.0, 1.0], is_dynamic=0),
+                                       body("/primitives/box.obj", [1.0, 1.0, 1.0])])[0]
+    np.testing.assert_array_equal(volumes, [np.nan, np.nan, 1.0])
+    # The mesh of the static body is not read
+    assert not mass_properties._mesh_integral_cache
+
+
+def test_mass_properties_round_trip():
+    with open(os.path.join(os.path.dirname(__file__), "example.json")) as file:
+        json_data = json.load(file)
+    # The example bodies are static, every other one is made dynamic
+    for i, rb_dict in enumerate(json_data["RigidBodies"]):
+        rb_dict["isDynamic"] = i % 2
+
+    urdf_str = json_str_to_urdf(json.dumps(json_data), mass_properties=True)
+    assert urdf_str.count("<inertial>") == len(json_data["RigidBodies"]) // 2
+
+    round_trip_data = json.loads(urdf_str_to_json(urdf_str))
+    assert round_trip_data == add_mass_properties(json_data)
+    assert all(("mass" in rb_dict) == bool(rb_dict["isDynamic"]) for rb_dict in round_trip_data["RigidBodies"])
+    assert all(rb_dict["mass"] > 0.0 for rb_dict in round_trip_data["RigidBodies"] if rb_dict["isDynamic"])
+
+
+def test_incomplete_mass_properties_are_reported():
+    json_data = {"Name": "scene", "RigidBodies": [dict(body("/primitives/box.obj", [1.0, 1.0, 1.0]), mass=2.0)]}
+    with pytest.raises(ValueError, match="centerOfMass, inertia"):
+        _json_data_to_urdf(json_data)
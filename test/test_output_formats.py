@@ -0,0 +1,89 @@
+import os
+import sys
+import re
+import json
+
+import numpy as np
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import json_str_to_urdf, urdf_to_json
+from deformable_simulator_scene_utilities.output_formats import (round_significant, dumps_json, format_metadata_value,
+                                                                 parse_metadata_value)
+
+TEST_DIR = os.path.dirname(__file__)
+PRIMITIVES_DIR = os.path.join(package_path, "deformable_simulator_scene_utilities", "meshes", "primitives")
+
+
+def test_round_significant():
+    values = [0.30000000000000004, 1.5707926535968348, -0.9999999999964794, 123456789.0, 1.23456789e-300,
+              -0.0, 0.0, np.inf, -np.inf]
+    rounded = round_significant(values, 6)
+    np.testing.assert_array_equal(rounded, [0.3, 1.57079, -1.0, 123457000.0, 1.23457e-300,
+                                            0.0, 0.0, np.inf, -np.inf])
+    # Negative zeros are normalized
+    assert not np.signbit(rounded[5])
+    assert np.isnan(round_significant([np.nan], 6)[0])
+    # The shortest representation has at most the requested number of digits
+    assert [repr(float(value)) for value in round_significant([2 / 3, 1e22 / 3], 4)] == ["0.6667", "3.333e+21"]
+
+
+def test_pretty_profile_matches_the_previous_output():
+    # Generated by the converter before the output profiles were added
+    with open(os.path.join(TEST_DIR, "example_pretty_profile.json")) as file:
+        expected = file.read().replace("PRIMITIVES_DIR", PRIMITIVES_DIR)
+    assert urdf_to_json(os.path.join(TEST_DIR, "example_pretty_profile.urdf")) == expected
+    assert urdf_to_json(os.path.join(TEST_DIR, "example_pretty_profile.urdf"), output_profile="pretty") == expected
+
+
+def test_canonical_profile_is_byte_identical_for_equal_scenes():
+    with open(os.path.join(TEST_DIR, "example.json")) as file:
+        json_data = json.load(file)
+
+    # The same scene with other key orders, negative zeros and noise below the significant digits
+    equal_data = {"RigidBodies": [], "Name": json_data["Name"]}
+    for body in json_data["RigidBodies"]:
+        equal_body = {}
+        for key in reversed(list(body)):
+            value = body[key]
+            if isinstance(value, list) and all(isinstance(v, float) for v in value):
+                value = [-0.0 if v == 0.0 else v * (1.0 + 1e-14) for v in value]
+            equal_body[key] = value
+        equal_data["RigidBodies"].append(equal_body)
+
+    assert json.dumps(equal_data) != json.dumps(json_data)
+    assert dumps_json(equal_data, "canonical") == dumps_json(json_data, "canonical")
+    assert json_str_to_urdf(json.dumps(equal_data), output_profile="canonical") \
+        == json_str_to_urdf(json.dumps(json_data), output_profile="canonical")
+
+
+@pytest.mark.parametrize("output_profile", ["compact", "canonical"])
+def test_significant_digits_hold_for_urdf_metadata(output_profile):
+    urdf_str = urdf_to_json(os.path.join(TEST_DIR, "..", "example", "l_shape_corridor_width_0.7.urdf"))
+    urdf_str = json_str_to_urdf(urdf_str, output_profile=output_profile, significant_digits=6)
+
+    mantissas = re.findall(r"(?<![\w.])-?(\d+\.\d+|\d+)(?:e[-+]?\d+)?", urdf_str)
+    assert mantissas
+    assert max(len(mantissa.replace(".", "").strip("0")) for mantissa in mantissas) <= 6
+
+
+@pytest.mark.parametrize("value, text", [
+    ("plain comment, with punctuation: <&>", "plain comment, with punctuation: <&>"),
+    ("/path/to/mesh.obj", "/path/to/mesh.obj"),
+    ("", ""),
+    ("42", '"42"'),
+    ("null", '"null"'),
+    ("True", '"True"'),
+    ("[1, 2]", '"[1, 2]"'),
+    ("'quoted'", '"\'quoted\'"'),
+    (" padded ", '" padded "'),
+    (1, "1"),
+    (0.5, "0.5"),
+    ([0.0, 1.5], "[0.0, 1.5]"),
+])
+def test_metadata_strings_are_only_quoted_when_ambiguous(value, text):
+    assert format_metadata_value(value) == text
+    assert parse_metadata_value(text) == value
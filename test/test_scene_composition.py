@@ -0,0 +1,67 @@
+import os
+import sys
+
+import numpy as np
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import Scene, compose_scenes, write_composed_scene
+
+EXAMPLE_JSON = os.path.join(os.path.dirname(__file__), "example.json")
+
+
+def test_ids_are_offset_per_scene():
+    scene = compose_scenes([EXAMPLE_JSON, EXAMPLE_JSON, EXAMPLE_JSON])
+    assert [body["id"] for body in scene.bodies] == list(range(1, 10))
+    assert scene.name == Scene.from_json_file(EXAMPLE_JSON).name
+
+
+def test_colliding_ids_are_renamed_when_kept():
+    scene = compose_scenes([EXAMPLE_JSON, EXAMPLE_JSON], remap_ids=False)
+    ids = [body["id"] for body in scene.bodies]
+    assert ids[:3] == [1, 2, 3]
+    assert len(set(ids)) == len(ids)
+
+
+def test_pose_offsets():
+    example = Scene.from_json_file(EXAMPLE_JSON)
+    pose = {"translation": [1.0, 2.0, 3.0], "rotationAxis": [0, 0, 1], "rotationAngle": np.pi / 2}
+    scene = compose_scenes([example, example], poses=[None, pose])
+
+    rotation = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    np.testing.assert_array_equal(scene.translations[:3], example.translations)
+    np.testing.assert_allclose(scene.translations[3:], example.translations @ rotation.T + [1.0, 2.0, 3.0],
+                               atol=1e-12)
+
+
+def test_streamed_output_matches_composed_scene(tmp_path):
+    scenes = [EXAMPLE_JSON] * 4
+    poses = [{"translation": [float(i), 0.0, 0.0]} for i in range(4)]
+    composed = compose_scenes(scenes, poses)
+
+    for output_profile in ("pretty", "compact", "canonical"):
+        json_path = str(tmp_path / "composed.json")
+        urdf_path = str(tmp_path / "composed.urdf")
+        write_composed_scene(scenes, json_path, poses, output_profile=output_profile)
+        write_composed_scene(scenes, urdf_path, poses, output_profile=output_profile)
+
+        with open(json_path) as file:
+            assert file.read() == composed.to_json_str(output_profile)
+        with open(urdf_path) as file:
+            assert file.read() == composed.to_urdf_str(output_profile)
+
+
+def test_streamed_mass_properties(tmp_path):
+    example = Scene.from_json_file(EXAMPLE_JSON)
+    for body in example.bodies:
+        body["isDynamic"] = 1
+    composed = compose_scenes([example, example])
+
+    urdf_path = str(tmp_path / "composed.urdf")
+    write_composed_scene([example, example], urdf_path, mass_properties=True)
+    with open(urdf_path) as file:
+        urdf_str = file.read()
+    assert urdf_str == composed.to_urdf_str(mass_properties=True)
+    assert urdf_str.count("<inertial>") == len(composed.bodies)
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import (Scene, json_str_to_urdf, urdf_str_to_json,
+                                                  compose_scenes, write_composed_scene)
+
+EXAMPLE_JSON = os.path.join(os.path.dirname(__file__), "example.json")
+
+
+def grouped_scene():
+    """Example scene with a table group holding two bodies and a drawer subgroup holding the third."""
+    with open(EXAMPLE_JSON) as file:
+        json_data = json.load(file)
+    json_data["RigidBodies"][0]["group"] = "table"
+    json_data["RigidBodies"][1]["group"] = "table"
+    json_data["RigidBodies"][2]["group"] = "drawer"
+    json_data["RigidBodyGroups"] = {
+        "table": {"translation": [1.0, 2.0, 0.5], "rotationAxis": [0.0, 0.0, 1.0], "rotationAngle": 0.3},
+        "drawer": {"parent": "table", "translation": [0.2, 0.0, -0.1], "rotationAxis": [1.0, 0.0, 0.0],
+                   "rotationAngle": 0.1},
+    }
+    return json_data
+
+
+def joint_parents(urdf_str):
+    json_data = json.loads(urdf_str_to_json(urdf_str, preserve_hierarchy=True))
+    return {body["id"]: body.get("group") for body in json_data["RigidBodies"]}, json_data
+
+
+def test_grouped_round_trip():
+    json_data = grouped_scene()
+    urdf_str = json_str_to_urdf(json.dumps(json_data))
+    assert '<parent link="table"/>' in urdf_str
+
+    groups, round_trip_data = joint_parents(urdf_str)
+    assert groups == {1: "table", 2: "table", 3: "drawer"}
+    assert round_trip_data["RigidBodyGroups"].keys() == json_data["RigidBodyGroups"].keys()
+    for group_name, group in json_data["RigidBodyGroups"].items():
+        round_trip_group = round_trip_data["RigidBodyGroups"][group_name]
+        assert round_trip_group.get("parent") == group.get("parent")
+        assert round_trip_group["translation"] == pytest.approx(group["translation"], abs=1e-12)
+        assert round_trip_group["rotationAngle"] == group["rotationAngle"]
+
+    # Body poses stay relative to the root
+    for body, round_trip_body in zip(json_data["RigidBodies"], round_trip_data["RigidBodies"]):
+        assert round_trip_body["translation"] == pytest.approx(body["translation"], abs=1e-12)
+        round_trip_body["translation"] = body["translation"]
+        assert round_trip_body == body
+
+
+def test_flattened_by_default():
+    json_data = grouped_scene()
+    flat_data = json.loads(urdf_str_to_json(json_str_to_urdf(json.dumps(json_data))))
+    assert "RigidBodyGroups" not in flat_data
+    for body, flat_body in zip(json_data["RigidBodies"], flat_data["RigidBodies"]):
+        assert "group" not in flat_body
+        assert flat_body["translation"] == pytest.approx(body["translation"], abs=1e-12)
+
+
+def test_moving_a_group_touches_one_joint():
+    json_data = grouped_scene()
+    urdf_str = json_str_to_urdf(json.dumps(json_data))
+
+    # Move the table by editing the origin of its joint only
+    origin_start = urdf_str.index('<origin', urdf_str.index('<joint name="joint_table"'))
+    origin_end = urdf_str.index('/>', origin_start)
+    urdf_str = urdf_str[:origin_start] + '<origin xyz="3.0 -1.0 0.5" rpy="0.0 0.0 -0.7"' + urdf_str[origin_end:]
+    moved_data = json.loads(urdf_str_to_json(urdf_str, preserve_hierarchy=True))
+
+    # The bodies of the table and its drawer move along, like moving the group of the scene
+    new_pose = {"translation": [3.0, -1.0, 0.5], "rotationAxis": [0.0, 0.0, 1.0], "rotationAngle": -0.7}
+    moved_scene = Scene.from_json_data(json_data).with_group_pose("table", new_pose)
+    np.testing.assert_allclose([body["translation"] for body in moved_data["RigidBodies"]],
+                               moved_scene.translations, atol=1e-9)
+    np.testing.assert_allclose([np.multiply(body["rotationAxis"], body["rotationAngle"])
+                                for body in moved_data["RigidBodies"]],
+                               moved_scene.rotation_axes * moved_scene.rotation_angles[:, np.newaxis], atol=1e-9)
+    assert moved_data["RigidBodyGroups"]["table"]["rotationAngle"] == pytest.approx(0.7)
+    assert moved_data["RigidBodyGroups"]["drawer"]["translation"] == pytest.approx([0.2, 0.0, -0.1], abs=1e-12)
+    assert moved_data["RigidBodyGroups"]["drawer"]["rotationAngle"] == 0.1
+
+
+@pytest.mark.parametrize("groups", [
+    {"a": {"parent": "b"}, "b": {"parent": "a"}},
+    {"a": {"parent": "missing"}},
+])
+def test_invalid_groups(groups):
+    json_data = grouped_scene()
+    json_data["RigidBodyGroups"].update(groups)
+    with pytest.raises(ValueError):
+        json_str_to_urdf(json.dumps(json_data))
+
+
+def test_composed_groups(tmp_path):
+    scenes = [grouped_scene(), grouped_scene()]
+    poses = [None, {"translation": [0.0, 5.0, 0.0]}]
+    composed = compose_scenes(scenes, poses)
+    assert list(composed.groups) == ["table", "drawer", "table_1", "drawer_1"]
+    assert composed.groups["drawer_1"]["parent"] == "table_1"
+    assert composed.groups["table_1"]["translation"] == [1.0, 7.0, 0.5]
+
+    for output_profile in ("pretty", "compact", "canonical"):
+        json_path = str(tmp_path / "composed.json")
+        urdf_path = str(tmp_path / "composed.urdf")
+        write_composed_scene(scenes, json_path, poses, output_profile=output_profile)
+        write_composed_scene(scenes, urdf_path, poses, output_profile=output_profile)
+
+        with open(json_path) as file:
+            assert file.read() == composed.to_json_str(output_profile)
+        # Streamed groups are written with the bodies of their sub-scene, the same tree in another order
+        with open(urdf_path) as file:
+            assert json.loads(urdf_str_to_json(file.read(), preserve_hierarchy=True)) \
+                == json.loads(urdf_str_to_json(composed.to_urdf_str(output_profile), preserve_hierarchy=True))
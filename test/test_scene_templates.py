@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import load_scene_template, expand_scene_template, add_mass_properties
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(__file__), "..", "example")
+SHIPPED_WIDTHS = [0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+
+
+def test_template_reproduces_the_shipped_corridors():
+    template = load_scene_template(os.path.join(EXAMPLE_DIR, "l_shape_corridor_template.json"))
+    scenes = expand_scene_template(template, {"width": SHIPPED_WIDTHS})
+    assert len(scenes) == len(SHIPPED_WIDTHS)
+
+    for width, scene in zip(SHIPPED_WIDTHS, scenes):
+        with open(os.path.join(EXAMPLE_DIR, f"l_shape_corridor_width_{width}.json")) as file:
+            expected = json.load(file)
+        json_data = scene.to_json_data()
+
+        assert len(json_data["RigidBodies"]) == len(expected["RigidBodies"])
+        for body, expected_body in zip(json_data["RigidBodies"], expected["RigidBodies"]):
+            # The shipped scenes were converted from URDFs with rounded rotations (1.5707926...)
+            for field in ("translation", "scale", "collisionObjectScale"):
+                np.testing.assert_allclose(body[field], expected_body[field], atol=1e-5)
+                body[field] = expected_body[field]
+            assert body == expected_body
+
+
+@pytest.mark.parametrize("expression", [
+    "[c for c in ().__class__.__base__.__subclasses__()][0] + 1",
+    "().__class__",
+    "__import__('os').system('true')",
+    "open('/etc/passwd')",
+    "width if width else 0",
+    "sqrt(x=width)",
+    "'a' * 3",
+    "9**9**9**9",
+    "base + 2 ** 10000",
+])
+def test_expressions_can_not_run_code(expression):
+    template = load_scene_template(os.path.join(EXAMPLE_DIR, "l_shape_corridor_template.json"))
+    template["Bodies"]["1"]["translation"] = [expression, None, None]
+    with pytest.raises(ValueError):
+        expand_scene_template(template, {"width": SHIPPED_WIDTHS})
+
+
+def test_expression_functions():
+    template = load_scene_template(os.path.join(EXAMPLE_DIR, "l_shape_corridor_template.json"))
+    template["Bodies"]["1"]["translation"] = ["base + maximum(width, 1.0) ** 2 - -cos(pi)", None, None]
+    base = expand_scene_template(template, {"width": [0.5]})[0]
+    scene = expand_scene_template(template, {"width": [0.5, 2.0]})[1]
+    assert scene.translations[0, 0] - base.translations[0, 0] == pytest.approx(3.0)
+
+
+def test_templated_scales_drop_the_base_mass_properties():
+    template = load_scene_template(os.path.join(EXAMPLE_DIR, "l_shape_corridor_template.json"))
+    with open(template["BaseScene"]) as file:
+        base_data = json.load(file)
+    for rb_dict in base_data["RigidBodies"]:
+        rb_dict["isDynamic"] = 1
+    template["BaseScene"] = add_mass_properties(base_data)
+
+    scene = expand_scene_template(template, {"width": [1.5]})[0]
+    bodies = {rb_dict["id"]: rb_dict for rb_dict in scene.to_json_data()["RigidBodies"]}
+    # Body 1 is only moved, the walls 2 and 3 are resized
+    assert bodies[1]["volume"] == pytest.approx(np.prod(bodies[1]["scale"]))
+    assert not any(field in bodies[i] for i in (2, 3) for field in ("volume", "mass", "centerOfMass", "inertia"))
+    assert scene.to_urdf_str().count("<inertial>") == len(bodies) - 2
+    assert "mass" in template["BaseScene"]["RigidBodies"][1]
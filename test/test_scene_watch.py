@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import shutil
+
+import pytest
+
+# This line inserts the package directory at the start of the system path
+package_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, package_path)
+
+from deformable_simulator_scene_utilities import SceneWatcher, json_str_to_urdf
+from deformable_simulator_scene_utilities.scene_watch import _load_libc_inotify
+
+EXAMPLE_JSON = os.path.join(os.path.dirname(__file__), "example.json")
+
+
+def edit_density(json_path, density):
+    with open(json_path) as file:
+        data = json.load(file)
+    data["RigidBodies"][0]["density"] = density
+    with open(json_path, "w") as file:
+        json.dump(data, file)
+
+
+def wait_and_process(watcher, timeout=0.05, attempts=20):
+    # Wait until the debounced changes are processed
+    for _ in range(attempts):
+        watcher.wait_for_changes(timeout)
+        replaced = watcher.process_pending()
+        if replaced:
+            return replaced
+    return []
+
+
+@pytest.mark.parametrize("use_inotify", [
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(_load_libc_inotify() is None, reason="inotify not available")),
+])
+def test_outputs_follow_input_edits(tmp_path, use_inotify):
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    shutil.copy(EXAMPLE_JSON, json_path)
+
+    with SceneWatcher({json_path: urdf_path}, debounce=0.0, poll_interval=0.01,
+                      use_inotify=use_inotify) as watcher:
+        # Missing outputs are generated on start
+        with open(urdf_path) as file, open(json_path) as json_file:
+            assert file.read() == json_str_to_urdf(json_file.read())
+
+        # A burst of edits results in a single regeneration with the last content
+        for density in (2.0, 3.0, 4.0):
+            edit_density(json_path, density)
+        assert wait_and_process(watcher) == [os.path.abspath(urdf_path)]
+        with open(urdf_path) as file:
+            assert "<density>4.0</density>" in file.read()
+
+        # Touching the input without changing it does not replace the output
+        os.utime(json_path)
+        assert wait_and_process(watcher, attempts=3) == []
+
+        # The generation on start is not a change latency
+        assert watcher.latency_report()["count"] == 1
+    assert sorted(os.listdir(tmp_path)) == ["scene.json", "scene.urdf"]
+
+
+def test_invalid_input_keeps_previous_output(tmp_path):
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    shutil.copy(EXAMPLE_JSON, json_path)
+
+    with SceneWatcher({json_path: urdf_path}, debounce=0.0, poll_interval=0.01, use_inotify=False) as watcher:
+        with open(urdf_path) as file:
+            previous_output = file.read()
+
+        with open(json_path, "w") as file:
+            file.write('{"Name": "half written')
+        assert wait_and_process(watcher, attempts=3) == []
+
+    with open(urdf_path) as file:
+        assert file.read() == previous_output
+
+
+def test_latency_is_measured_from_the_input_change(tmp_path):
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    shutil.copy(EXAMPLE_JSON, json_path)
+
+    with SceneWatcher({json_path: urdf_path}, debounce=0.0, poll_interval=0.01, use_inotify=False) as watcher:
+        # An edit noticed 10 s after it was made
+        edit_density(json_path, 2.0)
+        change_time_ns = os.stat(json_path).st_mtime_ns - 10 ** 10
+        os.utime(json_path, ns=(change_time_ns, change_time_ns))
+        assert wait_and_process(watcher) == [os.path.abspath(urdf_path)]
+
+        assert 10.0 <= watcher.latency_report()["last"] < 20.0
+
+
+def test_outputs_keep_their_permissions(tmp_path):
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    new_urdf_path = str(tmp_path / "new_scene.urdf")
+    shutil.copy(EXAMPLE_JSON, json_path)
+    with open(urdf_path, "w") as file:
+        file.write("")
+    os.chmod(urdf_path, 0o640)
+    os.utime(urdf_path, ns=(0, 0))
+
+    umask = os.umask(0o022)
+    try:
+        with SceneWatcher([(json_path, urdf_path), (json_path, new_urdf_path)], debounce=0.0,
+                          poll_interval=0.01, use_inotify=False):
+            pass
+    finally:
+        os.umask(umask)
+
+    assert os.path.getsize(urdf_path) > 0
+    assert os.stat(urdf_path).st_mode & 0o777 == 0o640
+    assert os.stat(new_urdf_path).st_mode & 0o777 == 0o644
+
+
+@pytest.mark.skipif(_load_libc_inotify() is None, reason="inotify not available")
+def test_unwatchable_directories_are_polled(tmp_path):
+    class FailingWatches:
+        # libc whose inotify_add_watch fails, e.g. on a file system without inotify support
+        def __init__(self, libc):
+            self.inotify_init1 = libc.inotify_init1
+
+        def inotify_add_watch(self, *args):
+            return -1
+
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    shutil.copy(EXAMPLE_JSON, json_path)
+
+    watcher = SceneWatcher({json_path: urdf_path}, debounce=0.0, poll_interval=0.01, use_inotify=True)
+    watcher._libc = FailingWatches(watcher._libc)
+    with watcher:
+        edit_density(json_path, 2.0)
+        assert wait_and_process(watcher) == [os.path.abspath(urdf_path)]
+
+
+def test_conversion_options(tmp_path):
+    with pytest.raises(TypeError):
+        SceneWatcher({"scene.json": "scene.urdf"}, output_profle="compact")
+    with pytest.raises(ValueError):
+        SceneWatcher({"scene.json": "scene.urdf"}, output_profile="small")
+
+    json_path = str(tmp_path / "scene.json")
+    urdf_path = str(tmp_path / "scene.urdf")
+    with open(EXAMPLE_JSON) as file:
+        data = json.load(file)
+    for rb_dict in data["RigidBodies"]:
+        rb_dict["isDynamic"] = 1
+    with open(json_path, "w") as file:
+        json.dump(data, file)
+
+    with SceneWatcher({json_path: urdf_path}, use_inotify=False, mass_properties=True):
+        with open(urdf_path) as file:
+            assert file.read().count("<inertial>") == len(data["RigidBodies"])
+
+
+def test_output_can_not_be_an_input(tmp_path):
+    with pytest.raises(ValueError):
+        SceneWatcher([("a.json", "b.urdf"), ("b.urdf", "c.json")])